@@ -47,6 +47,7 @@ class AssetMeta:
     extra_tags: list[str] = field(default_factory=list)
     clip_names: list[str] = field(default_factory=list)
     wants_colors: bool = False  # image-only post steps: colors + phash
+    image: Optional[Image.Image] = None  # decoded pixels for those steps; caller closes
 
 
 def _thumb_key(rel_path: str) -> str:
@@ -72,12 +73,18 @@ class ImageHandler(ExtensionHandler):
 
     def index_file(self, path: Path, ctx: IndexContext) -> AssetMeta:
         meta = AssetMeta(wants_colors=True)
+        img = None
         try:
-            with Image.open(path) as img:
-                meta.width, meta.height = img.size
+            # Decode once; bounds, colors and phash all read these pixels
+            img = Image.open(path)
+            img.load()
         except Exception:
-            pass
-        meta.preview_bounds = frame_detect.detect_preview_bounds(path, ctx.pack_root)
+            if img is not None:
+                img.close()
+            return meta
+        meta.width, meta.height = img.size
+        meta.preview_bounds = frame_detect.detect_preview_bounds(path, ctx.pack_root, img=img)
+        meta.image = img
         return meta
 
 
@@ -4,20 +4,38 @@
 # dependencies = [
 #     "httpx>=0.27",
 #     "rich>=13.0",
+#     "selectolax>=0.3.21",
 # ]
 # ///
 """Fetch pack preview images from itch.io (one-time operation)."""
 
+import asyncio
+import hashlib
 import re
+import shutil
 import time
 from pathlib import Path
 
 import httpx
 from rich.console import Console
 from rich.progress import Progress
+from selectolax.lexbor import LexborHTMLParser
 
 console = Console()
 
+# Simultaneous itch.io requests
+MAX_CONCURRENT = 8
+
+# Minimum seconds between requests to one host (be nice to itch.io)
+MIN_REQUEST_INTERVAL = 0.5
+
+# Downloaded pages and images are reused for a week
+CACHE_DIR = Path(".index/itch_cache")
+CACHE_TTL = 7 * 24 * 60 * 60
+
+# Bytes per write when streaming an image to disk
+DOWNLOAD_CHUNK = 64 * 1024
+
 # URL slug patterns for itch.io pages
 ITCH_URL_OVERRIDES = {
     # Special cases where slug doesn't match pack name
@@ -58,46 +76,69 @@ ITCH_URL_OVERRIDES = {
     "true-heroes": "minifantasy-true-heroes",
 }
 
+# Cover image selectors and the attribute holding the URL, in order of preference
+COVER_SELECTORS = (
+    # screenshot_list contains the actual cover image
+    (".screenshot_list img[src]", "src"),
+    # Animated GIF in the page (often used as cover)
+    ('img[src^="https://img.itch.zone/"][src$=".gif"]', "src"),
+    # Fallback to og:image meta tag
+    ('meta[property="og:image"][content]', "content"),
+)
 
-def extract_cover_image(html: str) -> str | None:
-    """Extract cover image URL from HTML (prefer game cover over og:image)."""
-    # Look for screenshot_list which contains the actual cover image
-    match = re.search(r'class="screenshot_list".*?<img[^>]*src="([^"]+)"', html, re.DOTALL)
-    if match:
-        # Use the URL as-is (keep the size parameter, it's valid)
-        return match.group(1)
+# Pack name / slug normalization
+TRAILING_NUMBER_RE = re.compile(r'\s+\d+$')
+VERSION_SUFFIX_RE = re.compile(r'[_ ]v\.?\d+\.?\d*(_Commercial_Version)?$', re.IGNORECASE)
+CAMEL_BOUNDARY_RE = re.compile(r'([a-z])([A-Z])')
+HYPHEN_RUN_RE = re.compile(r'-+')
+NON_SLUG_RE = re.compile(r'[^a-z0-9-]')
 
-    # Try to find animated GIF in the page (often used as cover)
-    match = re.search(r'<img[^>]*src="(https://img\.itch\.zone/[^"]+\.gif)"', html)
-    if match:
-        return match.group(1)
 
-    # Fallback to og:image meta tag
-    match = re.search(r'<meta\s+property="og:image"\s+content="([^"]+)"', html)
-    if match:
-        return match.group(1)
+class HostRateLimiter:
+    """Space out requests to each host by at least `interval` seconds."""
 
-    # Try alternate format
-    match = re.search(r'<meta\s+content="([^"]+)"\s+property="og:image"', html)
-    if match:
-        return match.group(1)
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._last: dict[str, float] = {}
 
+    async def wait(self, request: httpx.Request) -> None:
+        """httpx request hook: block until this request's host may be hit again."""
+        host = request.url.host
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        loop = asyncio.get_running_loop()
+        async with lock:
+            delay = self._last.get(host, -self.interval) + self.interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last[host] = loop.time()
+
+
+def extract_cover_image(html: str) -> str | None:
+    """Extract cover image URL from HTML (prefer game cover over og:image)."""
+    tree = LexborHTMLParser(html)
+    for selector, attr in COVER_SELECTORS:
+        node = tree.css_first(selector)
+        # A valueless attribute (<img src>) reads as None; try the next selector
+        if node is not None and (url := node.attributes.get(attr)):
+            # Use the URL as-is (keep the size parameter, it's valid)
+            return url
     return None
 
 
 def normalize_pack_name(name: str) -> str:
     """Normalize pack name by removing version suffix and extra words."""
     # Remove trailing numbers (like " 2" for duplicates) FIRST
-    name = re.sub(r'\s+\d+$', '', name)
+    name = TRAILING_NUMBER_RE.sub('', name)
     # Remove version suffix like _v1.0, _v.1.0, _v3.3_Commercial_Version (with underscore)
-    name = re.sub(r'[_ ]v\.?\d+\.?\d*(_Commercial_Version)?$', '', name, flags=re.IGNORECASE)
+    name = VERSION_SUFFIX_RE.sub('', name)
     return name
 
 
 def camel_to_kebab(name: str) -> str:
     """Convert CamelCase to kebab-case."""
     # Insert hyphen before uppercase letters
-    result = re.sub(r'([a-z])([A-Z])', r'\1-\2', name)
+    result = CAMEL_BOUNDARY_RE.sub(r'\1-\2', name)
     return result.lower()
 
 
@@ -127,14 +168,69 @@ def find_pack_url(pack_name: str) -> str | None:
     # Replace underscores and spaces with hyphens
     slug = slug.replace("_", "-").replace(" ", "-")
     # Remove consecutive hyphens
-    slug = re.sub(r'-+', '-', slug)
+    slug = HYPHEN_RUN_RE.sub('-', slug)
     # Remove special chars
-    slug = re.sub(r'[^a-z0-9-]', '', slug)
+    slug = NON_SLUG_RE.sub('', slug)
 
     return f"https://krishna-palacio.itch.io/minifantasy-{slug}"
 
 
-def fetch_preview(client: httpx.Client, pack_name: str, output_dir: Path) -> bool:
+def cache_path(url: str, ext: str) -> Path:
+    """Cache file for a URL, named by its blake2b digest."""
+    return CACHE_DIR / f"{hashlib.blake2b(url.encode(), digest_size=16).hexdigest()}{ext}"
+
+
+def is_fresh(path: Path) -> bool:
+    """Whether a cache file exists and is younger than CACHE_TTL."""
+    try:
+        return time.time() - path.stat().st_mtime < CACHE_TTL
+    except FileNotFoundError:
+        return False
+
+
+async def fetch_page(client: httpx.AsyncClient, url: str) -> str:
+    """Fetch page HTML, reading it from the cache while fresh."""
+    path = cache_path(url, ".html")
+    if is_fresh(path):
+        return path.read_text(encoding="utf-8")
+
+    resp = await client.get(url, follow_redirects=True)
+    resp.raise_for_status()
+    # Cache the decoded text, so a cached run sees exactly what this one did
+    path.write_text(resp.text, encoding="utf-8")
+    return resp.text
+
+
+async def fetch_image(client: httpx.AsyncClient, img_url: str) -> Path:
+    """Download an image into the cache unless it is fresh there; return its path."""
+    for ext in (".png", ".gif"):
+        path = cache_path(img_url, ext)
+        if is_fresh(path):
+            return path
+
+    # Stream to disk in chunks instead of holding the whole GIF in memory
+    async with client.stream("GET", img_url, follow_redirects=True) as img_resp:
+        img_resp.raise_for_status()
+
+        # Determine extension from URL or content type
+        ext = ".png"
+        if ".gif" in img_url.lower():
+            ext = ".gif"
+        elif img_resp.headers.get("content-type", "").startswith("image/gif"):
+            ext = ".gif"
+
+        path = cache_path(img_url, ext)
+        partial = path.with_suffix(".part")
+        with partial.open("wb") as f:
+            async for chunk in img_resp.aiter_bytes(DOWNLOAD_CHUNK):
+                f.write(chunk)
+
+    # Only complete downloads ever look fresh
+    partial.replace(path)
+    return path
+
+
+async def fetch_preview(client: httpx.AsyncClient, pack_name: str, output_dir: Path) -> bool:
     """Fetch and save preview image for a pack."""
     url = find_pack_url(pack_name)
     if not url:
@@ -143,29 +239,19 @@ def fetch_preview(client: httpx.Client, pack_name: str, output_dir: Path) -> boo
 
     try:
         # Fetch page
-        resp = client.get(url, follow_redirects=True)
-        resp.raise_for_status()
+        html = await fetch_page(client, url)
 
         # Extract image URL
-        img_url = extract_cover_image(resp.text)
+        img_url = extract_cover_image(html)
         if not img_url:
             console.print(f"[yellow]No cover image found for: {pack_name}[/yellow]")
             return False
 
         # Download image
-        img_resp = client.get(img_url, follow_redirects=True)
-        img_resp.raise_for_status()
-
-        # Determine extension from URL or content type
-        ext = ".png"
-        if ".gif" in img_url.lower():
-            ext = ".gif"
-        elif img_resp.headers.get("content-type", "").startswith("image/gif"):
-            ext = ".gif"
+        cached = await fetch_image(client, img_url)
 
         # Save image
-        output_path = output_dir / f"{pack_name}{ext}"
-        output_path.write_bytes(img_resp.content)
+        shutil.copyfile(cached, output_dir / f"{pack_name}{cached.suffix}")
 
         return True
     except httpx.HTTPError as e:
@@ -173,6 +259,27 @@ def fetch_preview(client: httpx.Client, pack_name: str, output_dir: Path) -> boo
         return False
 
 
+async def fetch_all(pack_names: list[str], output_dir: Path) -> int:
+    """Fetch previews concurrently, at most MAX_CONCURRENT requests in flight."""
+    sem = asyncio.Semaphore(MAX_CONCURRENT)
+    # Runs only for requests that reach the network, so cache hits don't wait
+    limiter = HostRateLimiter(MIN_REQUEST_INTERVAL)
+
+    async with httpx.AsyncClient(timeout=30.0, event_hooks={"request": [limiter.wait]}) as client:
+        with Progress() as progress:
+            task = progress.add_task("Fetching previews...", total=len(pack_names))
+
+            async def fetch_one(pack_name: str) -> bool:
+                async with sem:
+                    ok = await fetch_preview(client, pack_name, output_dir)
+                progress.advance(task)
+                return ok
+
+            results = await asyncio.gather(*(fetch_one(name) for name in pack_names))
+
+    return sum(results)
+
+
 def main(force: bool = False):
     """Fetch all pack previews from itch.io."""
     import sqlite3
@@ -199,32 +306,18 @@ def main(force: bool = False):
     # Create output directory
     output_dir = Path(".index/previews")
     output_dir.mkdir(parents=True, exist_ok=True)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
-    # Fetch previews
-    success_count = 0
+    # Skip packs that already have a preview (check both .png and .gif)
+    to_fetch = []
     skip_count = 0
+    for pack_name in pack_names:
+        if not force and any((output_dir / f"{pack_name}{ext}").exists() for ext in (".png", ".gif")):
+            skip_count += 1
+        else:
+            to_fetch.append(pack_name)
 
-    with httpx.Client(timeout=30.0) as client:
-        with Progress() as progress:
-            task = progress.add_task("Fetching previews...", total=len(pack_names))
-
-            for pack_name in pack_names:
-                # Skip if already exists (check both .png and .gif)
-                if not force:
-                    png_path = output_dir / f"{pack_name}.png"
-                    gif_path = output_dir / f"{pack_name}.gif"
-                    if png_path.exists() or gif_path.exists():
-                        skip_count += 1
-                        progress.advance(task)
-                        continue
-
-                if fetch_preview(client, pack_name, output_dir):
-                    success_count += 1
-
-                progress.advance(task)
-
-                # Be nice to itch.io
-                time.sleep(0.5)
+    success_count = asyncio.run(fetch_all(to_fetch, output_dir))
 
     console.print(f"\n[green]Done![/green] Downloaded {success_count} previews, skipped {skip_count} existing")
 
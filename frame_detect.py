@@ -2,6 +2,7 @@
 # /// script
 # requires-python = ">=3.11"
 # dependencies = [
+#     "numpy>=1.24",
 #     "pillow>=10.0",
 # ]
 # ///
@@ -14,9 +15,11 @@ transparent gaps inside a sprite for frame boundaries.
 """
 
 import re
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
 from PIL import Image
 
 # Pixels with alpha <= this are treated as transparent (ghost pixels).
@@ -63,33 +66,34 @@ def filename_hint(filename: str) -> Optional[tuple[int, int]]:
     return (int(m.group(1)), int(m.group(2))) if m else None
 
 
-def _clear_flags(data: bytes, length: int, count: int) -> list[bool]:
-    """flags[i] = line i (contiguous run of `length` bytes) is transparent."""
-    return [
-        max(data[i * length : (i + 1) * length]) <= ALPHA_THRESHOLD
-        for i in range(count)
-    ]
+def _visible(img: Image.Image) -> np.ndarray:
+    """(h, w) mask of pixels with alpha above ALPHA_THRESHOLD."""
+    return np.asarray(img.getchannel("A")) > ALPHA_THRESHOLD
+
+
+@lru_cache(maxsize=512)
+def _edge_candidates(n: int) -> tuple[int, ...]:
+    """Divisors of n from MIN_FRAME_EDGE to n/2, ascending."""
+    # Sheets reuse a handful of sizes, so each is only factored once
+    return tuple(d for d in range(MIN_FRAME_EDGE, n // 2 + 1) if n % d == 0)
 
 
-def _infer_edge(clear: list[bool], n: int) -> int:
+def _infer_edge(clear: np.ndarray, n: int) -> int:
     """Smallest divisor >= MIN_FRAME_EDGE of n whose grid lines are clear."""
-    for d in range(MIN_FRAME_EDGE, n // 2 + 1):
-        if n % d:
-            continue
-        if all(clear[k * d - 1] and clear[k * d] for k in range(1, n // d)):
+    for d in _edge_candidates(n):
+        # lines on both sides of every internal boundary k*d
+        if clear[d - 1:n - 1:d].all() and clear[d:n:d].all():
             return d
     return n
 
 
-def infer_grid(img: Image.Image) -> tuple[int, int]:
+def infer_grid(img: Image.Image, visible: Optional[np.ndarray] = None) -> tuple[int, int]:
     """Infer (frame_w, frame_h) from periodic fully-transparent lines."""
     w, h = img.size
-    alpha = img.getchannel("A")
-    rows = _clear_flags(alpha.tobytes(), w, h)
-    # transposed rows are the original columns
-    cols = _clear_flags(
-        alpha.transpose(Image.Transpose.TRANSPOSE).tobytes(), h, w
-    )
+    if visible is None:
+        visible = _visible(img)
+    cols = ~visible.any(axis=0)
+    rows = ~visible.any(axis=1)
     return _infer_edge(cols, w), _infer_edge(rows, h)
 
 
@@ -102,11 +106,10 @@ def _divides(size: tuple[int, int], sheet: tuple[int, int]) -> bool:
     )
 
 
-def resolve_frame_size(
-    path: Path, img: Image.Image, stop_dir: Path
-) -> tuple[int, int]:
-    """Frame size via AnimationInfo, filename hint, or grid inference."""
-    sheet = img.size
+def _declared_frame_size(
+    path: Path, sheet: tuple[int, int], stop_dir: Path
+) -> Optional[tuple[int, int]]:
+    """Frame size from AnimationInfo or the filename hint, if either fits."""
     declared = [
         s for s in animation_info_sizes(path.parent, stop_dir) if _divides(s, sheet)
     ]
@@ -115,37 +118,62 @@ def resolve_frame_size(
     hint = filename_hint(path.name)
     if hint and _divides(hint, sheet):
         return hint
-    return infer_grid(img)
+    return None
+
+
+def resolve_frame_size(
+    path: Path, img: Image.Image, stop_dir: Path, visible: Optional[np.ndarray] = None
+) -> tuple[int, int]:
+    """Frame size via AnimationInfo, filename hint, or grid inference."""
+    return _declared_frame_size(path, img.size, stop_dir) or infer_grid(img, visible)
+
+
+def _first_frame_bounds(
+    path: Path, img: Image.Image, stop_dir: Path
+) -> Optional[tuple[int, int, int, int]]:
+    if img.mode != "RGBA":
+        return None
+    # Alpha extrema decide the all-or-nothing sheets without building a mask
+    lo, hi = img.getchannel("A").getextrema()
+    if hi <= ALPHA_THRESHOLD:
+        return None
+    if lo > ALPHA_THRESHOLD:
+        # No transparent lines to infer a grid from, and every frame is all content
+        fw, fh = _declared_frame_size(path, img.size, stop_dir) or img.size
+        return (0, 0, fw, fh)
+    visible = _visible(img)
+    fw, fh = resolve_frame_size(path, img, stop_dir, visible)
+    w, h = img.size
+    rows, cols = h // fh, w // fw
+    # One reduction marks every occupied cell; row-major order picks the first
+    tiles = visible[:rows * fh, :cols * fw].reshape(rows, fh, cols, fw)
+    occupied = np.flatnonzero(tiles.any(axis=(1, 3)))
+    if occupied.size == 0:
+        return None
+    r, c = divmod(int(occupied[0]), cols)
+    cell = tiles[r, :, c, :]
+    xs = np.flatnonzero(cell.any(axis=0))
+    ys = np.flatnonzero(cell.any(axis=1))
+    x0 = max(0, int(xs[0]) - 1)
+    y0 = max(0, int(ys[0]) - 1)
+    x1 = min(fw, int(xs[-1]) + 2)
+    y1 = min(fh, int(ys[-1]) + 2)
+    return (c * fw + x0, r * fh + y0, x1 - x0, y1 - y0)
 
 
 def detect_preview_bounds(
-    path: Path, stop_dir: Optional[Path] = None
+    path: Path, stop_dir: Optional[Path] = None, img: Optional[Image.Image] = None
 ) -> Optional[tuple[int, int, int, int]]:
     """Visible-content crop of the first occupied frame of a sheet.
 
     Returns (x, y, w, h), or None when the image has no alpha channel
-    or no visible content. Crops never cross frame boundaries.
+    or no visible content. Crops never cross frame boundaries. Pass the
+    already-open img to avoid decoding path a second time.
     """
     try:
+        if img is not None:
+            return _first_frame_bounds(path, img, stop_dir or path.parent)
         with Image.open(path) as img:
-            if img.mode != "RGBA":
-                return None
-            fw, fh = resolve_frame_size(path, img, stop_dir or path.parent)
-            w, h = img.size
-            for cy in range(0, h - fh + 1, fh):
-                for cx in range(0, w - fw + 1, fw):
-                    cell = img.crop((cx, cy, cx + fw, cy + fh))
-                    mask = cell.getchannel("A").point(
-                        lambda p: 255 if p > ALPHA_THRESHOLD else 0
-                    )
-                    bbox = mask.getbbox()
-                    if bbox is None:
-                        continue
-                    x0 = max(0, bbox[0] - 1)
-                    y0 = max(0, bbox[1] - 1)
-                    x1 = min(fw, bbox[2] + 1)
-                    y1 = min(fh, bbox[3] + 1)
-                    return (cx + x0, cy + y0, x1 - x0, y1 - y0)
-            return None
+            return _first_frame_bounds(path, img, stop_dir or path.parent)
     except Exception:
         return None
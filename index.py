@@ -4,6 +4,7 @@
 # dependencies = [
 #     "pillow>=10.0",
 #     "imagehash>=4.3",
+#     "numpy>=1.24",
 #     "rich>=13.0",
 #     "typer>=0.9",
 #     "python-dotenv>=1.0",
@@ -12,11 +13,13 @@
 # ///
 """Build and update the game asset index."""
 
+import contextlib
 import hashlib
 import json
 import os
 import re
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
@@ -26,6 +29,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import imagehash
+import numpy as np
 import typer
 from PIL import Image
 from rich.console import Console
@@ -36,15 +40,17 @@ import asset_kinds
 import frame_detect
 import model_indexer
 from asset_kinds import ASEPRITE_EXTENSIONS, IMAGE_EXTENSIONS, MODEL_EXTENSIONS
+from palette import NEAREST_PALETTE_SQL, PALETTE_IDX_SQL
+from phash import pack_bits
 
 app = typer.Typer(help="Build and update the game asset index")
 console = Console()
 
 # Noise words to skip in tag extraction
-NOISE_WORDS = {
+NOISE_WORDS = frozenset({
     "assets", "asset", "commercial", "version", "free", "v", "the", "and", "or",
     "gifs", "gif", "shadows", "shadow", "animationinfo", "txt", "png",
-}
+})
 
 # Tag aliases for normalization
 TAG_ALIASES = {
@@ -56,8 +62,26 @@ TAG_ALIASES = {
     "anims": "animations",
 }
 
+# Animation actions tagged when they appear anywhere in a filename
+ACTIONS = ["attack", "idle", "walk", "run", "jump", "die", "damage", "hit", "cast", "shoot"]
+
+_WORD_SPLIT = re.compile(r"[_\-\s]+")
+_VERSION_WORD = re.compile(r"^v?\d+(\.\d+)*$", re.IGNORECASE)
+_PACK_VERSION = re.compile(r"v(\d+(?:\.\d+)*)", re.IGNORECASE)
+# Lookahead so overlapping actions are all found in one pass
+_ACTION = re.compile("(?=({}))".format("|".join(ACTIONS)))
+
+# Files indexed per transaction; bounds the WAL and the work lost to an interrupted run
+COMMIT_EVERY = 1000
+
+# Pack preview montages are PREVIEW_GRID x PREVIEW_GRID thumbnails
+PREVIEW_GRID = 4
+
+# Stored as PRAGMA user_version; bump with every migrate_schema step search.py relies on
+SCHEMA_VERSION = 4
+
 # Schema (same as search.py)
-SCHEMA = """
+SCHEMA = f"""
 CREATE TABLE IF NOT EXISTS packs (
     id INTEGER PRIMARY KEY,
     name TEXT NOT NULL,
@@ -79,6 +103,7 @@ CREATE TABLE IF NOT EXISTS assets (
     filetype TEXT NOT NULL,
     file_hash TEXT NOT NULL,
     file_size INTEGER,
+    file_mtime_ns INTEGER,
     width INTEGER,
     height INTEGER,
     preview_x INTEGER,
@@ -104,10 +129,27 @@ CREATE TABLE IF NOT EXISTS asset_tags (
     PRIMARY KEY (asset_id, tag_id)
 );
 
+-- Per-tag asset counts, kept current by triggers on asset_tags
+CREATE TABLE IF NOT EXISTS tag_counts (
+    tag_id INTEGER PRIMARY KEY REFERENCES tags(id),
+    count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_asset_tags_count_insert AFTER INSERT ON asset_tags BEGIN
+    INSERT INTO tag_counts (tag_id, count) VALUES (NEW.tag_id, 1)
+    ON CONFLICT(tag_id) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_asset_tags_count_delete AFTER DELETE ON asset_tags BEGIN
+    UPDATE tag_counts SET count = count - 1 WHERE tag_id = OLD.tag_id;
+END;
+
 CREATE TABLE IF NOT EXISTS asset_colors (
     asset_id INTEGER REFERENCES assets(id),
     color_hex TEXT,
     percentage REAL,
+    palette_idx INTEGER GENERATED ALWAYS AS ({PALETTE_IDX_SQL}) VIRTUAL,
+    nearest_palette INTEGER GENERATED ALWAYS AS ({NEAREST_PALETTE_SQL}) VIRTUAL,
     PRIMARY KEY (asset_id, color_hex)
 );
 
@@ -149,15 +191,26 @@ CREATE TABLE IF NOT EXISTS pack_tags (
 );
 
 CREATE INDEX IF NOT EXISTS idx_assets_filename ON assets(filename);
+CREATE INDEX IF NOT EXISTS idx_assets_filename_nocase ON assets(filename COLLATE NOCASE);
 CREATE INDEX IF NOT EXISTS idx_assets_filetype ON assets(filetype);
-CREATE INDEX IF NOT EXISTS idx_assets_pack_id ON assets(pack_id);
+CREATE INDEX IF NOT EXISTS idx_assets_pack_filename ON assets(pack_id, filename);
 CREATE INDEX IF NOT EXISTS idx_assets_file_hash ON assets(file_hash);
-CREATE INDEX IF NOT EXISTS idx_asset_tags_asset_id ON asset_tags(asset_id);
-CREATE INDEX IF NOT EXISTS idx_asset_tags_tag_id ON asset_tags(tag_id);
-CREATE INDEX IF NOT EXISTS idx_asset_colors_color ON asset_colors(color_hex);
+CREATE INDEX IF NOT EXISTS idx_asset_tags_tag_asset ON asset_tags(tag_id, asset_id);
+CREATE INDEX IF NOT EXISTS idx_asset_colors_hex_pct ON asset_colors(color_hex, percentage, asset_id);
+CREATE INDEX IF NOT EXISTS idx_asset_colors_asset_pct ON asset_colors(asset_id, percentage);
 CREATE INDEX IF NOT EXISTS idx_asset_animations_asset ON asset_animations(asset_id);
 CREATE INDEX IF NOT EXISTS idx_assets_kind ON assets(asset_kind);
 CREATE INDEX IF NOT EXISTS idx_assets_rig ON assets(rig);
+CREATE INDEX IF NOT EXISTS idx_ac_palette ON asset_colors(palette_idx, percentage);
+CREATE INDEX IF NOT EXISTS idx_ac_nearest ON asset_colors(nearest_palette, percentage);
+CREATE INDEX IF NOT EXISTS idx_tag_counts_count ON tag_counts(count DESC);
+-- superseded by composite indexes above or by primary keys
+DROP INDEX IF EXISTS idx_asset_tags_tag_id;
+DROP INDEX IF EXISTS idx_asset_colors_color;
+DROP INDEX IF EXISTS idx_assets_pack_id;
+DROP INDEX IF EXISTS idx_asset_tags_asset_id;
+
+PRAGMA user_version = {SCHEMA_VERSION};
 """
 
 
@@ -178,13 +231,57 @@ def migrate_schema(conn: sqlite3.Connection) -> None:
             conn.execute("ALTER TABLE assets ADD COLUMN rig TEXT")
         if "thumbnail_path" not in existing:
             conn.execute("ALTER TABLE assets ADD COLUMN thumbnail_path TEXT")
+        if "file_mtime_ns" not in existing:
+            conn.execute("ALTER TABLE assets ADD COLUMN file_mtime_ns INTEGER")
+    if "asset_tags" in tables and "tag_counts" not in tables:
+        # SCHEMA adds the triggers that keep this current from here on
+        conn.execute("""
+            CREATE TABLE tag_counts (
+                tag_id INTEGER PRIMARY KEY REFERENCES tags(id),
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("INSERT INTO tag_counts SELECT tag_id, COUNT(*) FROM asset_tags GROUP BY tag_id")
+    if "asset_colors" in tables:
+        # table_xinfo, unlike table_info, lists generated columns
+        existing = {r["name"] for r in conn.execute("PRAGMA table_xinfo(asset_colors)")}
+        if "palette_idx" not in existing:
+            conn.execute(
+                "ALTER TABLE asset_colors ADD COLUMN palette_idx INTEGER "
+                f"GENERATED ALWAYS AS ({PALETTE_IDX_SQL}) VIRTUAL"
+            )
+        if "nearest_palette" not in existing:
+            conn.execute(
+                "ALTER TABLE asset_colors ADD COLUMN nearest_palette INTEGER "
+                f"GENERATED ALWAYS AS ({NEAREST_PALETTE_SQL}) VIRTUAL"
+            )
+    if "asset_phash" in tables and conn.execute("PRAGMA user_version").fetchone()[0] < 4:
+        # Before v4 phashes were stored one byte per bit; pack them in place
+        conn.create_function(
+            "pack_phash", 1, lambda b: b if max(b) > 1 else pack_bits(b), deterministic=True
+        )
+        conn.execute("UPDATE asset_phash SET phash = pack_phash(phash) WHERE length(phash) = 64")
     conn.commit()
 
 
-def get_db(db_path: Path) -> sqlite3.Connection:
-    """Get database connection, creating schema if needed."""
+def get_db(db_path: Path, tune_writes: bool = False) -> sqlite3.Connection:
+    """Get database connection, creating schema if needed.
+
+    tune_writes tunes the connection for a long write-heavy run: WAL with
+    synchronous=NORMAL (one fsync per checkpoint, not per commit), a
+    64 MB page cache, in-memory temp tables and a bounded WAL file.
+    Every index run sets it; it is independent of index --bulk, which
+    drops secondary indexes.
+    """
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
+    if tune_writes:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA cache_size = -65536")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA mmap_size = 268435456")
+        conn.execute("PRAGMA journal_size_limit = 67108864")
     # migrate first: SCHEMA's CREATE INDEX on asset_kind/rig would fail on legacy DBs
     migrate_schema(conn)
     conn.executescript(SCHEMA)
@@ -193,16 +290,15 @@ def get_db(db_path: Path) -> sqlite3.Connection:
 
 def file_hash(path: Path) -> str:
     """Compute SHA256 hash of file."""
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+    # Unbuffered: file_digest reads into its own buffer, in C, with no
+    # per-chunk Python loop
+    with open(path, "rb", buffering=0) as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
 
 
 def extract_version(name: str) -> Optional[str]:
     """Extract version number from pack name."""
-    match = re.search(r"v(\d+(?:\.\d+)*)", name, re.IGNORECASE)
+    match = _PACK_VERSION.search(name)
     return match.group(1) if match else None
 
 
@@ -216,12 +312,23 @@ def get_image_info(path: Path) -> dict:
         return {}
 
 
-def compute_phash(path: Path) -> Optional[bytes]:
+def open_image(source: Path | Image.Image):
+    """Context manager over an image, opening it first when given a path.
+
+    An already-open image is passed through and left open for its owner.
+    """
+    if isinstance(source, Image.Image):
+        return contextlib.nullcontext(source)
+    return Image.open(source)
+
+
+def compute_phash(source: Path | Image.Image) -> Optional[bytes]:
     """Compute perceptual hash of image."""
     try:
-        with Image.open(path) as img:
+        with open_image(source) as img:
             h = imagehash.phash(img)
-            return h.hash.tobytes()
+            # 8 bytes for the default 8x8 hash instead of one byte per bit
+            return pack_bits(h.hash)
     except Exception:
         return None
 
@@ -250,29 +357,70 @@ def stage_pack_convention_preview(
     return f"previews/{dest.name}"
 
 
+def _load_tile(img_path: Path, row: Optional[sqlite3.Row], thumb_size: int) -> Image.Image:
+    """Decode one montage tile, cropped to its preview bounds and thumbnailed."""
+    with Image.open(img_path) as img:
+        # Use preview bounds if available
+        if row is not None and row["preview_x"] is not None:
+            img = img.crop((
+                row["preview_x"],
+                row["preview_y"],
+                row["preview_x"] + row["preview_width"],
+                row["preview_y"] + row["preview_height"]
+            ))
+
+        img.thumbnail((thumb_size, thumb_size), Image.Resampling.NEAREST)
+        return img
+
+
+def preview_candidates(
+    conn: sqlite3.Connection,
+    limit: int,
+    pack_id: Optional[int] = None,
+) -> dict[int, list[sqlite3.Row]]:
+    """Representative PNGs per pack (idle animations first), at most limit each.
+
+    Covers every pack in one windowed scan unless pack_id narrows it.
+    """
+    by_pack: dict[int, list[sqlite3.Row]] = {}
+    for row in conn.execute("""
+        SELECT pack_id, path, filename, preview_x, preview_y, preview_width, preview_height
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY pack_id
+                ORDER BY
+                    CASE WHEN filename LIKE '%Idle%' THEN 0 ELSE 1 END,
+                    category,
+                    filename
+            ) AS rn
+            FROM assets
+            WHERE filetype = 'png' AND (?1 IS NULL OR pack_id = ?1)
+        )
+        WHERE rn <= ?2
+        ORDER BY pack_id, rn
+    """, [pack_id, limit]):
+        by_pack.setdefault(row["pack_id"], []).append(row)
+    return by_pack
+
+
 def generate_pack_preview(
     conn: sqlite3.Connection,
     pack_id: int,
     asset_root: Path,
     preview_dir: Path,
-    grid_size: int = 4,
+    grid_size: int = PREVIEW_GRID,
     thumb_size: int = 64,
     db_root: Optional[Path] = None,
+    rows: Optional[list[sqlite3.Row]] = None,
 ) -> Optional[str]:
-    """Generate a preview montage for a pack."""
+    """Generate a preview montage for a pack.
+
+    rows are the pack's entry from preview_candidates(); they are queried
+    here when not given.
+    """
     db_root = db_root or preview_dir.parent.parent
-    # Get representative assets (prefer idle animations)
-    rows = conn.execute("""
-        SELECT path, filename, preview_x, preview_y, preview_width, preview_height
-        FROM assets
-        WHERE pack_id = ?
-        AND filetype = 'png'
-        ORDER BY
-            CASE WHEN filename LIKE '%Idle%' THEN 0 ELSE 1 END,
-            category,
-            filename
-        LIMIT ?
-    """, [pack_id, grid_size * grid_size]).fetchall()
+    if rows is None:
+        rows = preview_candidates(conn, grid_size * grid_size, pack_id).get(pack_id, [])
 
     entries: list[tuple[Path, Optional[sqlite3.Row]]] = [
         (asset_root / r["path"], r) for r in rows
@@ -297,27 +445,20 @@ def generate_pack_preview(
     preview_path = preview_dir / preview_name
 
     try:
+        # Decode and shrink tiles in parallel (PIL releases the GIL there);
+        # pasting stays on this thread
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            tiles = list(pool.map(lambda e: _load_tile(e[0], e[1], thumb_size), entries))
+
         montage = Image.new("RGBA", (grid_size * thumb_size, grid_size * thumb_size), (0, 0, 0, 0))
 
-        for i, (img_path, row) in enumerate(entries):
+        for i, img in enumerate(tiles):
             x = (i % grid_size) * thumb_size
             y = (i // grid_size) * thumb_size
-
-            with Image.open(img_path) as img:
-                # Use preview bounds if available
-                if row is not None and row["preview_x"] is not None:
-                    img = img.crop((
-                        row["preview_x"],
-                        row["preview_y"],
-                        row["preview_x"] + row["preview_width"],
-                        row["preview_y"] + row["preview_height"]
-                    ))
-
-                img.thumbnail((thumb_size, thumb_size), Image.Resampling.NEAREST)
-                # Center in cell
-                offset_x = (thumb_size - img.width) // 2
-                offset_y = (thumb_size - img.height) // 2
-                montage.paste(img, (x + offset_x, y + offset_y))
+            # Center in cell
+            offset_x = (thumb_size - img.width) // 2
+            offset_y = (thumb_size - img.height) // 2
+            montage.paste(img, (x + offset_x, y + offset_y))
 
         montage.save(preview_path)
         return str(preview_path.relative_to(preview_dir.parent))
@@ -326,85 +467,111 @@ def generate_pack_preview(
         return None
 
 
-def extract_colors(path: Path, num_colors: int = 5) -> list[tuple[str, float]]:
-    """Extract dominant colors from image."""
+def extract_colors(source: Path | Image.Image, num_colors: int = 5) -> list[tuple[str, float]]:
+    """Extract dominant colors from image.
+
+    Pixels are binned on a 5-bit-per-channel lattice so near-identical
+    shades count together; each bin reports its most frequent exact color,
+    so palette colors (and named-color search) survive anti-aliasing.
+    """
     try:
-        with Image.open(path) as img:
+        with open_image(source) as img:
             # Convert to RGB, ignore alpha
             img = img.convert("RGB")
             # Resize for speed
             img.thumbnail((100, 100))
-            # Get colors
-            colors = img.getcolors(maxcolors=10000)
-            if not colors:
+            pixels = np.asarray(img).reshape(-1, 3)
+            if not len(pixels):
                 return []
-            # Sort by count
-            colors.sort(key=lambda x: x[0], reverse=True)
-            total = sum(c[0] for c in colors)
+            # 15-bit keys, same bucket layout as palette.lattice_index
+            r, g, b = (pixels >> 3).astype(np.uint16).T
+            keys = r << 10 | g << 5 | b
+            # Counting pass over 32K bins, then a partial select of the top few
+            counts = np.bincount(keys, minlength=1 << 15)
+            k = min(num_colors, np.count_nonzero(counts))
+            top = np.argpartition(counts, -k)[-k:]
+            top = top[np.argsort(-counts[top], kind="stable")]
+            # Distinct exact colors (24-bit) with their counts and lattice bins
+            wide = pixels.astype(np.uint32)
+            exact, exact_counts = np.unique(
+                wide[:, 0] << 16 | wide[:, 1] << 8 | wide[:, 2], return_counts=True
+            )
+            exact_keys = (exact >> 19 & 31) << 10 | (exact >> 11 & 31) << 5 | (exact >> 3 & 31)
+            total = len(pixels)
             # Get top colors
             result = []
-            for count, rgb in colors[:num_colors]:
-                hex_color = "#{:02x}{:02x}{:02x}".format(*rgb)
-                percentage = count / total
+            for key in top:
+                percentage = counts[key] / total
                 if percentage >= 0.05:  # At least 5%
-                    result.append((hex_color, percentage))
+                    in_bin = exact_keys == key
+                    # ties go to the lowest color value, so output is deterministic
+                    mode = int(exact[in_bin][np.argmax(exact_counts[in_bin])])
+                    result.append((f"#{mode:06x}", float(percentage)))
             return result
     except Exception:
         return []
 
 
-def extract_tags_from_path(path: Path, asset_root: Path) -> list[str]:
-    """Extract tags from file path."""
-    rel_path = path.relative_to(asset_root)
+def extract_tags_from_path(
+    path: Path, asset_root: Path, rel_parts: Optional[tuple[str, ...]] = None
+) -> list[str]:
+    """Extract tags from file path.
+
+    rel_parts, when given, are path's parts relative to asset_root.
+    """
+    if rel_parts is None:
+        rel_parts = path.relative_to(asset_root).parts
     tags = set()
 
     # Split path components and filename
-    parts = list(rel_path.parts[:-1]) + [rel_path.stem]
+    parts = [*rel_parts[:-1], path.stem]
 
     for part in parts:
-        # Split on underscores and other separators
-        words = re.split(r"[_\-\s]+", part)
-        for word in words:
-            # Skip version numbers
-            if re.match(r"^v?\d+(\.\d+)*$", word, re.IGNORECASE):
-                continue
-            # Normalize
-            word = word.lower()
-            if word in NOISE_WORDS or len(word) < 2:
-                continue
-            # Apply aliases
-            word = TAG_ALIASES.get(word, word)
-            tags.add(word)
+        # Split on underscores and other separators, skipping version
+        # numbers and noise, then apply aliases
+        tags.update(
+            TAG_ALIASES.get(word, word)
+            for word in _WORD_SPLIT.split(part.lower())
+            if len(word) >= 2 and word not in NOISE_WORDS and not _VERSION_WORD.match(word)
+        )
 
     # Detect action from filename
-    filename_lower = path.stem.lower()
-    actions = ["attack", "idle", "walk", "run", "jump", "die", "damage", "hit", "cast", "shoot"]
-    for action in actions:
-        if action in filename_lower:
-            tags.add(action)
+    tags.update(m.group(1) for m in _ACTION.finditer(path.stem.lower()))
 
     return sorted(tags)
 
 
-def detect_pack(path: Path, asset_root: Path) -> tuple[str, Path]:
-    """Detect pack name and path from asset path."""
-    rel_path = path.relative_to(asset_root)
+def detect_pack(
+    path: Path, asset_root: Path, rel_parts: Optional[tuple[str, ...]] = None
+) -> tuple[str, Path]:
+    """Detect pack name and path from asset path.
+
+    rel_parts, when given, are path's parts relative to asset_root.
+    """
+    if rel_parts is None:
+        rel_parts = path.relative_to(asset_root).parts
     # Pack is typically the first directory level
-    if len(rel_path.parts) > 1:
-        pack_name = rel_path.parts[0]
+    if len(rel_parts) > 1:
+        pack_name = rel_parts[0]
         pack_path = asset_root / pack_name
         return pack_name, pack_path
     return "", asset_root
 
 
-def get_category(path: Path, pack_path: Path) -> str:
-    """Get category from path relative to pack."""
-    try:
-        rel = path.relative_to(pack_path)
-        if len(rel.parts) > 1:
-            return "/".join(rel.parts[:-1])
-    except ValueError:
-        pass
+def get_category(
+    path: Path, pack_path: Path, rel_parts: Optional[tuple[str, ...]] = None
+) -> str:
+    """Get category from path relative to pack.
+
+    rel_parts, when given, are path's parts relative to pack_path.
+    """
+    if rel_parts is None:
+        try:
+            rel_parts = path.relative_to(pack_path).parts
+        except ValueError:
+            return ""
+    if len(rel_parts) > 1:
+        return "/".join(rel_parts[:-1])
     return ""
 
 
@@ -414,128 +581,186 @@ def index_asset(
     asset_root: Path,
 ) -> int:
     """Index a single asset file. Returns asset ID."""
-    rel_path = str(file_path.relative_to(asset_root))
+    rel = file_path.relative_to(asset_root)
+    rel_path, rel_parts = str(rel), rel.parts
+    st = file_path.stat()
     current_hash = file_hash(file_path)
 
     # Detect pack
-    pack_name, pack_path = detect_pack(file_path, asset_root)
+    pack_name, pack_path = detect_pack(file_path, asset_root, rel_parts)
     pack_id = None
     if pack_name:
-        pack_rel = str(pack_path.relative_to(asset_root))
+        # The pack is the first directory level, so its path is its name
+        pack_rel = pack_name
         version = extract_version(pack_name)
-        conn.execute(
+        pack_id = conn.execute(
             """INSERT INTO packs (name, path, version, indexed_at)
                VALUES (?, ?, ?, ?)
                ON CONFLICT(path) DO UPDATE SET
                    name = excluded.name,
                    version = excluded.version,
-                   indexed_at = excluded.indexed_at""",
+                   indexed_at = excluded.indexed_at
+               RETURNING id""",
             [pack_name, pack_rel, version, datetime.now().isoformat()]
-        )
-        pack_id = conn.execute("SELECT id FROM packs WHERE path = ?", [pack_rel]).fetchone()[0]
+        ).fetchone()[0]
 
     # Get image/asset info based on file type
     img_info = {}
     ase_info = None
     preview_bounds = None
 
-    if file_path.suffix.lower() in IMAGE_EXTENSIONS:
-        img_info = get_image_info(file_path)
-        preview_bounds = frame_detect.detect_preview_bounds(file_path, pack_path)
-    elif file_path.suffix.lower() in ASEPRITE_EXTENSIONS:
-        ase_info = aseprite_parser.parse_aseprite(file_path)
-        img_info = {"width": ase_info["width"], "height": ase_info["height"]}
-
-    # Category
-    category = get_category(file_path, pack_path) if pack_name else ""
-
-    # Insert or update asset
-    conn.execute(
-        """INSERT OR REPLACE INTO assets
-           (pack_id, path, filename, filetype, file_hash, file_size,
-            width, height, preview_x, preview_y, preview_width, preview_height,
-            category, indexed_at)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        [
-            pack_id,
-            rel_path,
-            file_path.name,
-            file_path.suffix.lower().lstrip("."),
-            current_hash,
-            file_path.stat().st_size,
-            img_info.get("width"),
-            img_info.get("height"),
-            preview_bounds[0] if preview_bounds else None,
-            preview_bounds[1] if preview_bounds else None,
-            preview_bounds[2] if preview_bounds else None,
-            preview_bounds[3] if preview_bounds else None,
-            category,
-            datetime.now().isoformat(),
-        ]
-    )
-
-    asset_id = conn.execute("SELECT id FROM assets WHERE path = ?", [rel_path]).fetchone()[0]
-
-    # Extract and add tags from path
-    tags = extract_tags_from_path(file_path, asset_root)
-    add_tags(conn, asset_id, tags, "path")
-
-    # Extract and add tags from Aseprite file
-    if ase_info and ase_info.get("tags"):
-        add_tags(conn, asset_id, ase_info["tags"], "aseprite")
-
-    # Extract colors
-    if file_path.suffix.lower() in IMAGE_EXTENSIONS:
-        colors = extract_colors(file_path)
-        for hex_color, percentage in colors:
-            conn.execute(
+    # Closes the decoded image however indexing exits, including a failed load
+    with contextlib.ExitStack() as stack:
+        img = None
+        if file_path.suffix.lower() in IMAGE_EXTENSIONS:
+            try:
+                # Decode once for bounds, colors and phash
+                img = stack.enter_context(Image.open(file_path))
+                img.load()
+                img_info = {"width": img.width, "height": img.height}
+            except Exception:
+                img = None
+            preview_bounds = frame_detect.detect_preview_bounds(file_path, pack_path, img=img)
+        elif file_path.suffix.lower() in ASEPRITE_EXTENSIONS:
+            ase_info = aseprite_parser.parse_aseprite(file_path)
+            img_info = {"width": ase_info["width"], "height": ase_info["height"]}
+
+        # Category
+        category = get_category(file_path, pack_path, rel_parts[1:]) if pack_name else ""
+
+        # Insert or update asset
+        asset_id = conn.execute(
+            """INSERT INTO assets
+               (pack_id, path, filename, filetype, file_hash, file_size, file_mtime_ns,
+                width, height, preview_x, preview_y, preview_width, preview_height,
+                category, indexed_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(path) DO UPDATE SET
+                   pack_id = excluded.pack_id, filename = excluded.filename,
+                   filetype = excluded.filetype, file_hash = excluded.file_hash,
+                   file_size = excluded.file_size, file_mtime_ns = excluded.file_mtime_ns,
+                   width = excluded.width,
+                   height = excluded.height, preview_x = excluded.preview_x,
+                   preview_y = excluded.preview_y, preview_width = excluded.preview_width,
+                   preview_height = excluded.preview_height, category = excluded.category,
+                   indexed_at = excluded.indexed_at
+               RETURNING id""",
+            [
+                pack_id,
+                rel_path,
+                file_path.name,
+                file_path.suffix.lower().lstrip("."),
+                current_hash,
+                st.st_size,
+                st.st_mtime_ns,
+                img_info.get("width"),
+                img_info.get("height"),
+                preview_bounds[0] if preview_bounds else None,
+                preview_bounds[1] if preview_bounds else None,
+                preview_bounds[2] if preview_bounds else None,
+                preview_bounds[3] if preview_bounds else None,
+                category,
+                datetime.now().isoformat(),
+            ]
+        ).fetchone()[0]
+        clear_derived_rows(conn, asset_id)
+
+        # Extract and add tags from path
+        tags = extract_tags_from_path(file_path, asset_root, rel_parts)
+        add_tags(conn, asset_id, tags, "path")
+
+        # Extract and add tags from Aseprite file
+        if ase_info and ase_info.get("tags"):
+            add_tags(conn, asset_id, ase_info["tags"], "aseprite")
+
+        # Extract colors
+        if file_path.suffix.lower() in IMAGE_EXTENSIONS:
+            source = img if img is not None else file_path
+            colors = extract_colors(source)
+            conn.executemany(
                 """INSERT OR REPLACE INTO asset_colors (asset_id, color_hex, percentage)
                    VALUES (?, ?, ?)""",
-                [asset_id, hex_color, percentage]
+                [(asset_id, hex_color, percentage) for hex_color, percentage in colors]
             )
 
-        # Compute perceptual hash
-        phash = compute_phash(file_path)
-        if phash:
-            conn.execute(
-                """INSERT OR REPLACE INTO asset_phash (asset_id, phash)
-                   VALUES (?, ?)""",
-                [asset_id, phash]
-            )
+            # Compute perceptual hash
+            phash = compute_phash(source)
+            if phash:
+                conn.execute(
+                    """INSERT OR REPLACE INTO asset_phash (asset_id, phash)
+                       VALUES (?, ?)""",
+                    [asset_id, phash]
+                )
 
     return asset_id
 
 
-def add_tags(conn: sqlite3.Connection, asset_id: int, tags: list[str], source: str):
-    """Add tags to an asset."""
-    for tag in tags:
-        # Get or create tag
-        conn.execute("INSERT OR IGNORE INTO tags (name) VALUES (?)", [tag])
-        tag_id = conn.execute("SELECT id FROM tags WHERE name = ?", [tag]).fetchone()[0]
-        # Link to asset
-        conn.execute(
-            "INSERT OR IGNORE INTO asset_tags (asset_id, tag_id, source) VALUES (?, ?, ?)",
-            [asset_id, tag_id, source]
+def clear_derived_rows(conn: sqlite3.Connection, asset_id: int) -> None:
+    """Drop an asset's rows derived from its file, ahead of re-deriving them.
+
+    The asset keeps its id across re-indexing, so without this a changed
+    file would keep stale colors, clips and tags. Tags users added stay.
+    """
+    conn.execute("DELETE FROM asset_tags WHERE asset_id = ? AND source != 'user'", [asset_id])
+    for table in ("asset_colors", "asset_phash", "asset_embeddings", "asset_animations"):
+        conn.execute(f"DELETE FROM {table} WHERE asset_id = ?", [asset_id])
+    conn.execute("DELETE FROM asset_relations WHERE ? IN (asset_id, related_id)", [asset_id])
+
+
+def add_tags(
+    conn: sqlite3.Connection,
+    asset_id: int,
+    tags: list[str],
+    source: str,
+    tag_ids: Optional[dict[str, int]] = None,
+):
+    """Add tags to an asset.
+
+    tag_ids is an optional name -> id cache shared across calls; tags
+    missing from it are created and added to it.
+    """
+    if tag_ids is None:
+        # Get or create every tag, then link them by name in one pass
+        conn.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(tag,) for tag in tags])
+        conn.executemany(
+            """INSERT OR IGNORE INTO asset_tags (asset_id, tag_id, source)
+               SELECT ?, id, ? FROM tags WHERE name = ?""",
+            [(asset_id, source, tag) for tag in tags]
         )
+        return
+
+    for tag in tags:
+        if tag not in tag_ids:
+            tag_ids[tag] = conn.execute(
+                """INSERT INTO tags (name) VALUES (?)
+                   ON CONFLICT(name) DO UPDATE SET name = excluded.name
+                   RETURNING id""",
+                [tag]
+            ).fetchone()[0]
+    conn.executemany(
+        "INSERT OR IGNORE INTO asset_tags (asset_id, tag_id, source) VALUES (?, ?, ?)",
+        [(asset_id, tag_ids[tag], source) for tag in tags]
+    )
 
 
 def scan_assets(asset_root: Path) -> list[Path]:
     """Scan directory for files claimed by a kind handler."""
-    def visible(p: Path) -> bool:
-        return not any(part.startswith(".") for part in p.relative_to(asset_root).parts)
-
     regular: list[Path] = []
     models: list[Path] = []
-    for p in asset_root.rglob("*"):
-        if not p.is_file() or not visible(p):
-            continue
-        handler = asset_kinds.find_handler(p)
-        if handler is None:
-            continue
-        if isinstance(handler, asset_kinds.ModelHandler):
-            models.append(p)
-        else:
-            regular.append(p)
+    for root, dirs, filenames in os.walk(asset_root):
+        # Prune hidden directories (.git, .index, ...) instead of walking them
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in filenames:
+            if name.startswith("."):
+                continue
+            p = Path(root, name)
+            handler = asset_kinds.find_handler(p)
+            if handler is None:
+                continue
+            if isinstance(handler, asset_kinds.ModelHandler):
+                models.append(p)
+            else:
+                regular.append(p)
     models = model_indexer.filter_canonical_models(sorted(models))
     return sorted(regular + models)
 
@@ -608,13 +833,95 @@ def set_pack_preview(
     return updated
 
 
+def drop_secondary_indexes(conn: sqlite3.Connection) -> list[str]:
+    """Drop SCHEMA's lookup indexes on the bulk-loaded tables; SCHEMA recreates them."""
+    names = [r[0] for r in conn.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'index' AND sql IS NOT NULL
+          AND tbl_name IN ('assets', 'asset_tags', 'asset_colors')
+    """)]
+    for name in names:
+        conn.execute(f'DROP INDEX "{name}"')
+    conn.commit()
+    return names
+
+
+def analyze_file(
+    file_path: Path,
+    asset_root: Path,
+    db_root: Path,
+    known: dict[str, tuple[str, Optional[int], Optional[int]]],
+) -> Optional[dict]:
+    """Everything index stores for one file, computed without the database.
+
+    known maps rel paths to their stored (file_hash, file_size, file_mtime_ns).
+    Returns None when size and mtime both match, without reading the file.
+    A file whose mtime moved but whose hash still matches comes back as
+    {"unchanged": True, ...} so only its mtime is refreshed.
+    Safe to run on worker threads.
+    """
+    rel = file_path.relative_to(asset_root)
+    rel_path, rel_parts = str(rel), rel.parts
+    st = file_path.stat()
+    prev = known.get(rel_path)
+    if prev is not None and prev[1:] == (st.st_size, st.st_mtime_ns):
+        return None
+    current_hash = file_hash(file_path)
+    if prev is not None and prev[0] == current_hash:
+        return {"unchanged": True, "rel_path": rel_path, "file_mtime_ns": st.st_mtime_ns}
+
+    pack_name, pack_path = detect_pack(file_path, asset_root, rel_parts)
+    handler = asset_kinds.find_handler(file_path)
+    ctx = asset_kinds.IndexContext(
+        asset_root=asset_root,
+        pack_root=pack_path if pack_name else asset_root,
+        db_root=db_root,
+        rel_path=rel_path,
+    )
+    meta = handler.index_file(file_path, ctx)
+
+    colors, phash = [], None
+    try:
+        if meta.wants_colors:
+            source = meta.image if meta.image is not None else file_path
+            colors = extract_colors(source)
+            phash = compute_phash(source)
+    finally:
+        if meta.image is not None:
+            meta.image.close()
+            meta.image = None
+
+    return {
+        "file_path": file_path,
+        "rel_path": rel_path,
+        "file_hash": current_hash,
+        "file_size": st.st_size,
+        "file_mtime_ns": st.st_mtime_ns,
+        "pack_name": pack_name,
+        "pack_path": pack_path,
+        "category": get_category(file_path, pack_path, rel_parts[1:]) if pack_name else "",
+        "tags": extract_tags_from_path(file_path, asset_root, rel_parts),
+        "meta": meta,
+        "colors": colors,
+        "phash": phash,
+    }
+
+
 @app.command()
 def index(
     asset_path: Path = typer.Argument(..., help="Path to assets directory"),
     db: Path = typer.Option("assets.db", "--db", help="Output database path"),
     force: bool = typer.Option(False, "--force", "-f", help="Force full reindex"),
+    bulk: bool = typer.Option(
+        False, "--bulk", help="Drop secondary indexes during the load, rebuild them after"
+    ),
 ):
     """Index assets from a directory."""
+    index_directory(asset_path, db, force=force, bulk=bulk)
+
+
+def index_directory(asset_path: Path, db: Path, force: bool = False, bulk: bool = False) -> None:
+    """Index assets from a directory into db (shared by index and update)."""
     asset_root = asset_path.resolve()
     if not asset_root.is_dir():
         console.print(f"[red]Not a directory: {asset_root}[/red]")
@@ -622,14 +929,20 @@ def index(
 
     # resolve so db.parent is absolute — thumbnail_path is stored relative to it
     db = db.resolve()
-    conn = get_db(db)
+    conn = get_db(db, tune_writes=True)
     console.print(f"Indexing [cyan]{asset_root}[/cyan] -> [green]{db}[/green]")
 
-    # Get existing hashes for incremental update
+    # Get existing hashes and stat keys for incremental update
     existing = {}
     if not force:
-        for row in conn.execute("SELECT path, file_hash FROM assets"):
-            existing[row["path"]] = row["file_hash"]
+        for row in conn.execute("SELECT path, file_hash, file_size, file_mtime_ns FROM assets"):
+            existing[row["path"]] = (row["file_hash"], row["file_size"], row["file_mtime_ns"])
+
+    if bulk:
+        # One sorted build per index afterwards beats a random B-tree insert
+        # per row; unique constraints (needed by the upserts) are kept
+        dropped = drop_secondary_indexes(conn)
+        console.print(f"Dropped {len(dropped)} indexes for the bulk load")
 
     # Scan for assets
     with Progress(
@@ -651,104 +964,123 @@ def index(
         new_count = 0
         skip_count = 0
 
-        for file_path in files:
-            rel_path = str(file_path.relative_to(asset_root))
+        # Hashing, decoding and metadata run on worker threads (hashlib, PIL
+        # and NumPy release the GIL); SQLite writes stay on this thread
+        def analyze(file_path: Path) -> Optional[dict]:
+            return analyze_file(file_path, asset_root, db.parent, existing)
 
-            # Check if unchanged
-            current_hash = file_hash(file_path)
-            if rel_path in existing and existing[rel_path] == current_hash:
-                skip_count += 1
-                progress.advance(index_task)
-                continue
+        # Tag name -> id, so add_tags only touches `tags` for new names
+        tag_ids = dict(conn.execute("SELECT name, id FROM tags").fetchall())
 
-            # Detect pack
-            pack_name, pack_path = detect_pack(file_path, asset_root)
-            if pack_name and pack_name not in packs_seen:
-                pack_rel = str(pack_path.relative_to(asset_root))
-                version = extract_version(pack_name)
-                conn.execute(
-                    """INSERT INTO packs (name, path, version, indexed_at)
-                       VALUES (?, ?, ?, ?)
+        workers = max(1, (os.cpu_count() or 4))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            for result in ex.map(analyze, files):
+                if result is None or result.get("unchanged"):
+                    if result is not None:
+                        # Touched but identical; record the new mtime so the
+                        # next run skips it without hashing
+                        conn.execute(
+                            "UPDATE assets SET file_mtime_ns = ? WHERE path = ?",
+                            [result["file_mtime_ns"], result["rel_path"]]
+                        )
+                    skip_count += 1
+                    progress.advance(index_task)
+                    continue
+
+                file_path = result["file_path"]
+                rel_path = result["rel_path"]
+                pack_name, pack_path = result["pack_name"], result["pack_path"]
+                meta = result["meta"]
+                preview_bounds = meta.preview_bounds
+
+                # Track pack
+                if pack_name and pack_name not in packs_seen:
+                    # The pack is the first directory level, so its path is its name
+                    pack_rel = pack_name
+                    version = extract_version(pack_name)
+                    pack_id = conn.execute(
+                        """INSERT INTO packs (name, path, version, indexed_at)
+                           VALUES (?, ?, ?, ?)
+                           ON CONFLICT(path) DO UPDATE SET
+                               name = excluded.name,
+                               version = excluded.version,
+                               indexed_at = excluded.indexed_at
+                           RETURNING id""",
+                        [pack_name, pack_rel, version, datetime.now().isoformat()]
+                    ).fetchone()[0]
+                    packs_seen[pack_name] = pack_id
+                pack_id = packs_seen.get(pack_name)
+
+                # Insert or update asset
+                asset_id = conn.execute(
+                    """INSERT INTO assets
+                       (pack_id, path, filename, filetype, file_hash, file_size, file_mtime_ns,
+                        width, height, preview_x, preview_y, preview_width, preview_height,
+                        category, asset_kind, rig, thumbnail_path, indexed_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                        ON CONFLICT(path) DO UPDATE SET
-                           name = excluded.name,
-                           version = excluded.version,
-                           indexed_at = excluded.indexed_at""",
-                    [pack_name, pack_rel, version, datetime.now().isoformat()]
-                )
-                pack_id = conn.execute("SELECT id FROM packs WHERE path = ?", [pack_rel]).fetchone()[0]
-                packs_seen[pack_name] = pack_id
-            pack_id = packs_seen.get(pack_name)
-
-            handler = asset_kinds.find_handler(file_path)
-            ctx = asset_kinds.IndexContext(
-                asset_root=asset_root,
-                pack_root=pack_path if pack_name else asset_root,
-                db_root=db.parent,
-                rel_path=rel_path,
-            )
-            meta = handler.index_file(file_path, ctx)
-            preview_bounds = meta.preview_bounds
-
-            # Category
-            category = get_category(file_path, pack_path) if pack_name else ""
-
-            # Insert or update asset
-            conn.execute(
-                """INSERT OR REPLACE INTO assets
-                   (pack_id, path, filename, filetype, file_hash, file_size,
-                    width, height, preview_x, preview_y, preview_width, preview_height,
-                    category, asset_kind, rig, thumbnail_path, indexed_at)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                [
-                    pack_id,
-                    rel_path,
-                    file_path.name,
-                    file_path.suffix.lower().lstrip("."),
-                    current_hash,
-                    file_path.stat().st_size,
-                    meta.width,
-                    meta.height,
-                    preview_bounds[0] if preview_bounds else None,
-                    preview_bounds[1] if preview_bounds else None,
-                    preview_bounds[2] if preview_bounds else None,
-                    preview_bounds[3] if preview_bounds else None,
-                    category, meta.asset_kind, meta.rig, meta.thumbnail_path,
-                    datetime.now().isoformat(),
-                ]
-            )
-            asset_id = conn.execute("SELECT id FROM assets WHERE path = ?", [rel_path]).fetchone()[0]
-
-            # Extract and add tags
-            tags = extract_tags_from_path(file_path, asset_root)
-            add_tags(conn, asset_id, tags, "path")
-
-            if meta.extra_tags:
-                add_tags(conn, asset_id, meta.extra_tags, "kind")
-            for i, name in enumerate(meta.clip_names):
-                conn.execute(
+                           pack_id = excluded.pack_id, filename = excluded.filename,
+                           filetype = excluded.filetype, file_hash = excluded.file_hash,
+                           file_size = excluded.file_size,
+                           file_mtime_ns = excluded.file_mtime_ns, width = excluded.width,
+                           height = excluded.height, preview_x = excluded.preview_x,
+                           preview_y = excluded.preview_y, preview_width = excluded.preview_width,
+                           preview_height = excluded.preview_height, category = excluded.category,
+                           asset_kind = excluded.asset_kind, rig = excluded.rig,
+                           thumbnail_path = excluded.thumbnail_path, indexed_at = excluded.indexed_at
+                       RETURNING id""",
+                    [
+                        pack_id,
+                        rel_path,
+                        file_path.name,
+                        file_path.suffix.lower().lstrip("."),
+                        result["file_hash"],
+                        result["file_size"],
+                        result["file_mtime_ns"],
+                        meta.width,
+                        meta.height,
+                        preview_bounds[0] if preview_bounds else None,
+                        preview_bounds[1] if preview_bounds else None,
+                        preview_bounds[2] if preview_bounds else None,
+                        preview_bounds[3] if preview_bounds else None,
+                        result["category"], meta.asset_kind, meta.rig, meta.thumbnail_path,
+                        datetime.now().isoformat(),
+                    ]
+                ).fetchone()[0]
+                clear_derived_rows(conn, asset_id)
+
+                # Add tags
+                add_tags(conn, asset_id, result["tags"], "path", tag_ids)
+
+                if meta.extra_tags:
+                    add_tags(conn, asset_id, meta.extra_tags, "kind", tag_ids)
+                conn.executemany(
                     "INSERT OR REPLACE INTO asset_animations (asset_id, clip_index, name) VALUES (?, ?, ?)",
-                    [asset_id, i, name]
+                    [(asset_id, i, name) for i, name in enumerate(meta.clip_names)]
                 )
-            if meta.wants_colors:
-                colors = extract_colors(file_path)
-                for hex_color, percentage in colors:
-                    conn.execute(
-                        """INSERT OR REPLACE INTO asset_colors (asset_id, color_hex, percentage)
-                           VALUES (?, ?, ?)""",
-                        [asset_id, hex_color, percentage]
-                    )
-                # Compute perceptual hash
-                phash = compute_phash(file_path)
-                if phash:
+                conn.executemany(
+                    """INSERT OR REPLACE INTO asset_colors (asset_id, color_hex, percentage)
+                       VALUES (?, ?, ?)""",
+                    [(asset_id, hex_color, percentage) for hex_color, percentage in result["colors"]]
+                )
+                if result["phash"]:
                     conn.execute(
                         """INSERT OR REPLACE INTO asset_phash (asset_id, phash)
                            VALUES (?, ?)""",
-                        [asset_id, phash]
+                        [asset_id, result["phash"]]
                     )
 
-            new_count += 1
-            progress.advance(index_task)
+                new_count += 1
+                progress.advance(index_task)
+                if new_count % COMMIT_EVERY == 0:
+                    conn.commit()
+
+        conn.commit()
 
+    if bulk:
+        console.print("Rebuilding indexes...")
+        conn.executescript(SCHEMA)
+        conn.execute("ANALYZE")
         conn.commit()
 
     # Link character meshes to animation bundles within each pack
@@ -785,7 +1117,8 @@ def index(
         conn.execute("UPDATE packs SET preview_path = NULL WHERE preview_generated = TRUE")
         conn.commit()
     console.print("Generating pack previews...")
-    for row in conn.execute("SELECT id, name, path, preview_path, source FROM packs"):
+    candidates = preview_candidates(conn, PREVIEW_GRID * PREVIEW_GRID)
+    for row in conn.execute("SELECT id, name, path, preview_path, source FROM packs").fetchall():
         if row["source"] == "user":
             continue  # boards own their cover; never auto-generate one
         if row["preview_path"]:
@@ -795,7 +1128,10 @@ def index(
         if convention:
             preview_path = stage_pack_convention_preview(convention, preview_dir, row["name"])
         else:
-            preview_path = generate_pack_preview(conn, row["id"], asset_root, preview_dir, db_root=db.parent)
+            preview_path = generate_pack_preview(
+                conn, row["id"], asset_root, preview_dir, db_root=db.parent,
+                rows=candidates.get(row["id"], []),
+            )
         if preview_path:
             conn.execute(
                 "UPDATE packs SET preview_path = ?, preview_generated = TRUE WHERE id = ?",
@@ -825,7 +1161,6 @@ def index(
             new_path = str(thumb)
         return r["id"], new_path
 
-    from concurrent.futures import ThreadPoolExecutor, as_completed
     workers = max(1, (os.cpu_count() or 4))
     with Progress(
         SpinnerColumn(), TextColumn("[progress.description]{task.description}"),
@@ -841,6 +1176,14 @@ def index(
                 progress.advance(task)
     conn.commit()
 
+    # First run on this DB: give the planner stats for the composite indexes;
+    # afterwards only re-analyze tables that changed enough to matter
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        conn.execute("ANALYZE")
+    else:
+        conn.execute("PRAGMA optimize")
+    conn.commit()
+
     console.print(f"\n[green]Done![/green] Indexed {new_count} new/changed, skipped {skip_count} unchanged.")
 
     # Show stats
@@ -882,7 +1225,7 @@ def update(
 
     # Re-run index
     console.print(f"Updating index from [cyan]{asset_root}[/cyan]")
-    index(asset_root, db, force=False)
+    index_directory(asset_root, db)
 
 
 @app.command("set-preview")
@@ -0,0 +1,58 @@
+"""Color palette and RGB lattice shared by the indexer schema and color search."""
+
+import functools
+
+# Basic color name to hex ranges
+COLOR_NAMES = {
+    "red": ("#ff0000", "#cc0000", "#990000", "#ff3333", "#cc3333"),
+    "green": ("#00ff00", "#00cc00", "#009900", "#33ff33", "#33cc33", "#336633", "#669966"),
+    "blue": ("#0000ff", "#0000cc", "#000099", "#3333ff", "#3333cc", "#333366"),
+    "yellow": ("#ffff00", "#cccc00", "#999900", "#ffff33"),
+    "orange": ("#ff8800", "#ff6600", "#cc6600", "#ff9933"),
+    "purple": ("#ff00ff", "#cc00cc", "#990099", "#9900ff", "#6600cc"),
+    "brown": ("#8b4513", "#a0522d", "#cd853f", "#d2691e", "#8b5a2b"),
+    "black": ("#000000", "#111111", "#222222", "#333333"),
+    "white": ("#ffffff", "#eeeeee", "#dddddd", "#cccccc"),
+    "gray": ("#888888", "#999999", "#aaaaaa", "#777777", "#666666"),
+    "grey": ("#888888", "#999999", "#aaaaaa", "#777777", "#666666"),
+}
+
+# Integer id per color name; spelling variants share one id
+_ids: dict[tuple[str, ...], int] = {}
+PALETTE_IDX = {name: _ids.setdefault(hexes, len(_ids)) for name, hexes in COLOR_NAMES.items()}
+
+HEX2PALETTE = {hx: PALETTE_IDX[name] for name, hexes in COLOR_NAMES.items() for hx in hexes}
+
+# SQL for asset_colors.palette_idx, a generated column over color_hex
+PALETTE_IDX_SQL = "CASE color_hex {} END".format(
+    " ".join(f"WHEN '{hx}' THEN {idx}" for hx, idx in HEX2PALETTE.items())
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def hex_to_rgb(hex_color: str) -> tuple[int, int, int]:
+    """Convert hex color to RGB tuple; ValueError unless it is [#]rrggbb."""
+    hex_color = hex_color.lstrip("#")
+    # bytes.fromhex decodes the three channel pairs in C; unlike int(s, 16)
+    # it also rejects "_" and sign characters
+    channels = bytes.fromhex(hex_color) if len(hex_color) == 6 else b""
+    if len(channels) != 3:
+        raise ValueError(f"Expected #rrggbb, got {hex_color!r}")
+    r, g, b = channels
+    return r, g, b
+
+
+def lattice_index(hex_color: str) -> int:
+    """Bucket of a hex color in a 32x32x32 RGB lattice (5 bits per channel)."""
+    r, g, b = hex_to_rgb(hex_color)
+    return (r >> 3) << 10 | (g >> 3) << 5 | (b >> 3)
+
+
+def _channel_sql(pos: int) -> str:
+    digit = "(instr('0123456789abcdef', substr(lower(color_hex), {}, 1)) - 1)"
+    return f"(({digit.format(pos)} * 16 + {digit.format(pos + 1)}) >> 3)"
+
+
+# SQL for asset_colors.nearest_palette; mirrors lattice_index for '#rrggbb'
+# (SQLite gives << and | equal precedence, hence the explicit grouping)
+NEAREST_PALETTE_SQL = "(({} << 10) | ({} << 5) | {})".format(*(_channel_sql(p) for p in (2, 4, 6)))
@@ -0,0 +1,56 @@
+"""Vectorized perceptual-hash scans shared by search.py and the web API."""
+
+import heapq
+import sqlite3
+
+import numpy as np
+
+# Set bits per byte value, for NumPy < 2.0 without np.bitwise_count
+POPCOUNT_LUT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def pack_bits(bits) -> bytes:
+    """Pack an imagehash bit array, or a legacy one-byte-per-bit blob, 8 bits per byte."""
+    if isinstance(bits, (bytes, bytearray, memoryview)):
+        bits = np.frombuffer(bits, dtype=np.uint8)
+    return np.packbits(np.asarray(bits, dtype=bool)).tobytes()
+
+
+def hamming_batch(hashes: bytes, ref_hash: bytes) -> np.ndarray:
+    """Hamming distances from ref_hash to each hash in a concatenated buffer."""
+    # Whole 64-bit words where the hash length allows, so XOR and popcount
+    # work on eight bytes at a time
+    dtype = np.uint64 if len(ref_hash) % 8 == 0 else np.uint8
+    ref = np.frombuffer(ref_hash, dtype=dtype)
+    xor = np.frombuffer(hashes, dtype=dtype).reshape(-1, ref.size) ^ ref
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.int32)
+    return POPCOUNT_LUT[xor.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+def nearest(
+    cursor: sqlite3.Cursor,
+    ref_hash: bytes,
+    limit: int,
+    max_distance: int,
+    min_distance: int = 0,
+    batch_size: int = 1024,
+) -> list[tuple[int, int]]:
+    """Closest (distance, asset_id) pairs from a cursor of (asset_id, phash) tuples.
+
+    Every phash must be the same length as ref_hash. The cursor is consumed
+    in batch_size chunks, and each chunk keeps at most `limit` survivors,
+    so memory stays bounded by one chunk. Equal distances are broken by
+    the lower asset_id, so results don't depend on row order or batching.
+    """
+    def candidates():
+        while batch := cursor.fetchmany(batch_size):
+            dists = hamming_batch(b"".join(row[1] for row in batch), ref_hash)
+            keep = np.flatnonzero((dists >= min_distance) & (dists <= max_distance))
+            if keep.size > limit:
+                ids = np.array([batch[i][0] for i in keep])
+                keep = keep[np.lexsort((ids, dists[keep]))[:limit]]
+            for i in keep:
+                yield int(dists[i]), batch[i][0]
+
+    return heapq.nsmallest(limit, candidates())
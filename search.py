@@ -3,37 +3,25 @@
 # requires-python = ">=3.11"
 # dependencies = [
 #     "typer>=0.9",
+#     "numpy>=1.24",
 # ]
 # ///
 """Search your game asset index."""
 
+import functools
+import json
+import os
 import sys
 import sqlite3
+import struct
 from pathlib import Path
 from typing import Optional
 
 import typer
 
-# Basic color name to hex ranges
-COLOR_NAMES = {
-    "red": ("#ff0000", "#cc0000", "#990000", "#ff3333", "#cc3333"),
-    "green": ("#00ff00", "#00cc00", "#009900", "#33ff33", "#33cc33", "#336633", "#669966"),
-    "blue": ("#0000ff", "#0000cc", "#000099", "#3333ff", "#3333cc", "#333366"),
-    "yellow": ("#ffff00", "#cccc00", "#999900", "#ffff33"),
-    "orange": ("#ff8800", "#ff6600", "#cc6600", "#ff9933"),
-    "purple": ("#ff00ff", "#cc00cc", "#990099", "#9900ff", "#6600cc"),
-    "brown": ("#8b4513", "#a0522d", "#cd853f", "#d2691e", "#8b5a2b"),
-    "black": ("#000000", "#111111", "#222222", "#333333"),
-    "white": ("#ffffff", "#eeeeee", "#dddddd", "#cccccc"),
-    "gray": ("#888888", "#999999", "#aaaaaa", "#777777", "#666666"),
-    "grey": ("#888888", "#999999", "#aaaaaa", "#777777", "#666666"),
-}
-
-
-def hex_to_rgb(hex_color: str) -> tuple[int, int, int]:
-    """Convert hex color to RGB tuple."""
-    hex_color = hex_color.lstrip("#")
-    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+from palette import (
+    COLOR_NAMES, NEAREST_PALETTE_SQL, PALETTE_IDX, PALETTE_IDX_SQL, hex_to_rgb, lattice_index,
+)
 
 
 def color_distance(c1: str, c2: str) -> float:
@@ -45,7 +33,10 @@ def color_distance(c1: str, c2: str) -> float:
 
 app = typer.Typer(help="Search your game asset index")
 
-SCHEMA = """
+# Stored as PRAGMA user_version; must match index.py
+SCHEMA_VERSION = 4
+
+SCHEMA = f"""
 -- Asset packs (top-level grouping)
 CREATE TABLE IF NOT EXISTS packs (
     id INTEGER PRIMARY KEY,
@@ -91,11 +82,28 @@ CREATE TABLE IF NOT EXISTS asset_tags (
     PRIMARY KEY (asset_id, tag_id)
 );
 
+-- Per-tag asset counts, kept current by triggers on asset_tags
+CREATE TABLE IF NOT EXISTS tag_counts (
+    tag_id INTEGER PRIMARY KEY REFERENCES tags(id),
+    count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_asset_tags_count_insert AFTER INSERT ON asset_tags BEGIN
+    INSERT INTO tag_counts (tag_id, count) VALUES (NEW.tag_id, 1)
+    ON CONFLICT(tag_id) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_asset_tags_count_delete AFTER DELETE ON asset_tags BEGIN
+    UPDATE tag_counts SET count = count - 1 WHERE tag_id = OLD.tag_id;
+END;
+
 -- Dominant colors per asset
 CREATE TABLE IF NOT EXISTS asset_colors (
     asset_id INTEGER REFERENCES assets(id),
     color_hex TEXT,
     percentage REAL,
+    palette_idx INTEGER GENERATED ALWAYS AS ({PALETTE_IDX_SQL}) VIRTUAL,
+    nearest_palette INTEGER GENERATED ALWAYS AS ({NEAREST_PALETTE_SQL}) VIRTUAL,
     PRIMARY KEY (asset_id, color_hex)
 );
 
@@ -113,24 +121,61 @@ CREATE TABLE IF NOT EXISTS asset_embeddings (
 
 -- Indexes for fast search
 CREATE INDEX IF NOT EXISTS idx_assets_filename ON assets(filename);
+CREATE INDEX IF NOT EXISTS idx_assets_filename_nocase ON assets(filename COLLATE NOCASE);
 CREATE INDEX IF NOT EXISTS idx_assets_filetype ON assets(filetype);
-CREATE INDEX IF NOT EXISTS idx_assets_pack_id ON assets(pack_id);
-CREATE INDEX IF NOT EXISTS idx_asset_tags_asset_id ON asset_tags(asset_id);
-CREATE INDEX IF NOT EXISTS idx_asset_tags_tag_id ON asset_tags(tag_id);
-CREATE INDEX IF NOT EXISTS idx_asset_colors_color ON asset_colors(color_hex);
+CREATE INDEX IF NOT EXISTS idx_assets_pack_filename ON assets(pack_id, filename);
+CREATE INDEX IF NOT EXISTS idx_asset_tags_tag_asset ON asset_tags(tag_id, asset_id);
+CREATE INDEX IF NOT EXISTS idx_asset_colors_hex_pct ON asset_colors(color_hex, percentage, asset_id);
+CREATE INDEX IF NOT EXISTS idx_asset_colors_asset_pct ON asset_colors(asset_id, percentage);
+CREATE INDEX IF NOT EXISTS idx_ac_palette ON asset_colors(palette_idx, percentage);
+CREATE INDEX IF NOT EXISTS idx_ac_nearest ON asset_colors(nearest_palette, percentage);
+CREATE INDEX IF NOT EXISTS idx_tag_counts_count ON tag_counts(count DESC);
+
+PRAGMA user_version = {SCHEMA_VERSION};
 """
 
 
-def get_db(db_path: Path) -> sqlite3.Connection:
-    """Get database connection, creating schema if needed."""
+def get_db(db_path: Path, read_only: bool = False) -> sqlite3.Connection:
+    """Get database connection, creating schema if needed.
+
+    With ``read_only`` an existing index is opened ``mode=ro`` and the schema
+    script is skipped; a missing or empty database falls back to a normal
+    connection so the schema still gets created. An index written by an older
+    index.py is rejected, since only index.py knows how to migrate it.
+    """
+    if read_only and db_path.exists():
+        conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'assets'").fetchone():
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                conn.close()
+                raise typer.BadParameter(f"{db_path} is out of date. Run index.py update to migrate it.")
+            _tune(conn)
+            conn.execute("PRAGMA query_only = ON")
+            return conn
+        conn.close()
+
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
-    conn.executescript(SCHEMA)
+    _tune(conn)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'assets'").fetchone() is None:
+        conn.executescript(SCHEMA)
     return conn
 
 
+def _tune(conn: sqlite3.Connection) -> None:
+    """Read-path pragmas: mmap the file, 64 MB page cache, in-memory temp."""
+    conn.execute("PRAGMA mmap_size = 268435456")
+    conn.execute("PRAGMA cache_size = -65536")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
 def find_db() -> Path:
-    """Find assets.db in current directory or parent directories."""
+    """Find assets.db via $ASSETS_DB, else in current or parent directories."""
+    if env_path := os.environ.get("ASSETS_DB"):
+        return Path(env_path)
     current = Path.cwd()
     for parent in [current] + list(current.parents):
         db_path = parent / "assets.db"
@@ -139,30 +184,46 @@ def find_db() -> Path:
     raise typer.BadParameter("No assets.db found. Run index.py first.")
 
 
+_U64 = struct.Struct(">Q")
+
+
 def hamming_distance(h1: bytes, h2: bytes) -> int:
-    """Calculate hamming distance between two hashes."""
-    return sum(bin(a ^ b).count("1") for a, b in zip(h1, h2))
+    """Calculate hamming distance between two equal-length hashes."""
+    if len(h1) != len(h2):
+        # the integer XOR would silently misalign bits instead of truncating like zip()
+        raise ValueError(f"hash lengths differ: {len(h1)} != {len(h2)}")
+    if len(h1) == 8:
+        # packed 64-bit phash: two C-level unpacks instead of int.from_bytes
+        return (_U64.unpack(h1)[0] ^ _U64.unpack(h2)[0]).bit_count()
+    return (int.from_bytes(h1, "big") ^ int.from_bytes(h2, "big")).bit_count()
 
 
 @app.command()
 def search(
     query: Optional[str] = typer.Argument(None, help="Search filename/path"),
+    starts_with: bool = typer.Option(False, "--starts-with", help="Match QUERY as a filename prefix"),
     tag: list[str] = typer.Option([], "--tag", "-t", help="Filter by tag"),
-    color: Optional[str] = typer.Option(None, "--color", "-c", help="Filter by dominant color (hex or name)"),
+    color: Optional[str] = typer.Option(None, "--color", "-c", help="Filter by dominant color (name, or hex incl. near shades)"),
     pack: Optional[str] = typer.Option(None, "--pack", "-p", help="Filter by pack"),
     filetype: Optional[str] = typer.Option(None, "--type", help="Filter by filetype"),
     db: Optional[Path] = typer.Option(None, "--db", help="Path to assets.db"),
     limit: int = typer.Option(50, "--limit", "-n", help="Max results"),
+    with_tags: bool = typer.Option(True, "--with-tags/--no-tags", help="Show each result's tags"),
 ):
     """Search assets by name, tags, or filters."""
     db_path = db or find_db()
-    conn = get_db(db_path)
+    conn = get_db(db_path, read_only=True)
 
     # Build query
     conditions = []
     params = []
 
-    if query:
+    if query and starts_with:
+        # Anchored LIKE can range-seek idx_assets_filename_nocase
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append("a.filename LIKE ? ESCAPE '\\'")
+        params.append(f"{escaped}%")
+    elif query:
         conditions.append("(a.filename LIKE ? OR a.path LIKE ?)")
         params.extend([f"%{query}%", f"%{query}%"])
 
@@ -175,67 +236,81 @@ def search(
         params.append(filetype.lower().lstrip("."))
 
     if tag:
-        for t in tag:
-            conditions.append("""
-                a.id IN (
-                    SELECT at.asset_id FROM asset_tags at
-                    JOIN tags t ON at.tag_id = t.id
-                    WHERE t.name = ?
-                )
-            """)
-            params.append(t.lower())
+        # One clause for any number of tags: the SQL text only depends on
+        # which filters are present, never on how many tags were given
+        wanted = sorted({t.lower() for t in tag})
+        conditions.append("""
+            a.id IN (
+                SELECT at.asset_id FROM asset_tags at
+                JOIN tags t ON at.tag_id = t.id
+                WHERE t.name IN (SELECT value FROM json_each(?))
+                GROUP BY at.asset_id
+                HAVING COUNT(*) = ?
+            )
+        """)
+        params.extend([json.dumps(wanted), len(wanted)])
 
     if color:
         color_lower = color.lower()
-        if color_lower in COLOR_NAMES:
-            hex_values = COLOR_NAMES[color_lower]
-            placeholders = ",".join("?" * len(hex_values))
-            conditions.append(f"""
+        if color_lower in PALETTE_IDX:
+            conditions.append("""
                 a.id IN (
                     SELECT asset_id FROM asset_colors
-                    WHERE color_hex IN ({placeholders})
+                    WHERE palette_idx = ?
                     AND percentage >= 0.1
                 )
             """)
-            params.extend(hex_values)
+            params.append(PALETTE_IDX[color_lower])
         else:
+            # Free-form hex matches any color in the same RGB lattice cell
+            try:
+                bucket = lattice_index(color)
+            except ValueError:
+                raise typer.BadParameter(f"Unknown color: {color}")
             conditions.append("""
                 a.id IN (
                     SELECT asset_id FROM asset_colors
-                    WHERE color_hex = ?
+                    WHERE nearest_palette = ?
                     AND percentage >= 0.1
                 )
             """)
-            params.append(color if color.startswith("#") else f"#{color}")
+            params.append(bucket)
 
     where = " AND ".join(conditions) if conditions else "1=1"
 
     sql = f"""
         SELECT a.id, a.path, a.filename, a.filetype, a.width, a.height,
-               a.preview_width, a.preview_height, p.name as pack_name,
-               GROUP_CONCAT(DISTINCT t.name) as tags
+               a.preview_width, a.preview_height, p.name as pack_name
         FROM assets a
         LEFT JOIN packs p ON a.pack_id = p.id
-        LEFT JOIN asset_tags at ON a.id = at.asset_id
-        LEFT JOIN tags t ON at.tag_id = t.id
         WHERE {where}
-        GROUP BY a.id
         ORDER BY a.filename
         LIMIT ?
     """
     params.append(limit)
 
-    rows = conn.execute(sql, params).fetchall()
+    rows = conn.execute(sql, params).fetchall()  # at most `limit` rows
 
     if not rows:
         print("No assets found.", file=sys.stderr)
         return
 
+    # Tags for just the page of results, in one select-in query
+    tags_by_id = {}
+    if with_tags:
+        ids = [row["id"] for row in rows]
+        tags_by_id = dict(conn.execute(f"""
+            SELECT at.asset_id, GROUP_CONCAT(t.name)
+            FROM asset_tags at JOIN tags t ON at.tag_id = t.id
+            WHERE at.asset_id IN ({",".join("?" * len(ids))})
+            GROUP BY at.asset_id
+        """, ids).fetchall())
+
     for row in rows:
         size = f"{row['width']}x{row['height']}" if row['width'] else "-"
         if row['preview_width'] and row['preview_height']:
             size += f" (preview: {row['preview_width']}x{row['preview_height']})"
-        tags = row['tags'] or ""
+        tags = tags_by_id.get(row['id']) or ""
         print(f"{row['id']}\t{row['path']}\t{size}\t{row['pack_name'] or '-'}\t{tags}")
 
 
@@ -245,7 +320,7 @@ def packs(
 ):
     """List all indexed packs."""
     db_path = db or find_db()
-    conn = get_db(db_path)
+    conn = get_db(db_path, read_only=True)
 
     rows = conn.execute("""
         SELECT p.id, p.name, p.path, p.version, p.asset_count, p.preview_path
@@ -269,14 +344,14 @@ def tags(
 ):
     """List all tags with counts."""
     db_path = db or find_db()
-    conn = get_db(db_path)
+    conn = get_db(db_path, read_only=True)
 
     rows = conn.execute("""
-        SELECT t.name, COUNT(at.asset_id) as count
-        FROM tags t
-        JOIN asset_tags at ON t.id = at.tag_id
-        GROUP BY t.id
-        ORDER BY count DESC
+        SELECT t.name, c.count
+        FROM tag_counts c
+        JOIN tags t ON t.id = c.tag_id
+        WHERE c.count > 0
+        ORDER BY c.count DESC
         LIMIT ?
     """, [limit]).fetchall()
 
@@ -295,7 +370,7 @@ def info(
 ):
     """Show detailed info for an asset."""
     db_path = db or find_db()
-    conn = get_db(db_path)
+    conn = get_db(db_path, read_only=True)
 
     row = conn.execute("""
         SELECT a.*, p.name as pack_name
@@ -348,7 +423,7 @@ def stats(
 ):
     """Show index statistics."""
     db_path = db or find_db()
-    conn = get_db(db_path)
+    conn = get_db(db_path, read_only=True)
 
     pack_count = conn.execute("SELECT COUNT(*) FROM packs").fetchone()[0]
     asset_count = conn.execute("SELECT COUNT(*) FROM assets").fetchone()[0]
@@ -368,6 +443,38 @@ def stats(
         print(f"{ft['filetype']}\t{ft['count']}")
 
 
+@app.command()
+def analyze(
+    db: Optional[Path] = typer.Option(None, "--db", help="Path to assets.db"),
+):
+    """Refresh query planner statistics."""
+    db_path = db or find_db()
+    conn = get_db(db_path)
+
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    print(f"Analyzed {db_path}", file=sys.stderr)
+
+
+@functools.cache
+def _get_imagehash():
+    """Import imagehash and PIL on first use; most commands never need them."""
+    import imagehash
+    from PIL import Image
+    return imagehash, Image
+
+
+@functools.lru_cache(maxsize=64)
+def _file_phash(path: str, mtime_ns: int) -> bytes:
+    """Perceptual hash of an external image; mtime_ns invalidates the cache entry."""
+    from phash import pack_bits
+
+    imagehash, Image = _get_imagehash()
+    with Image.open(path) as img:
+        return pack_bits(imagehash.phash(img).hash)
+
+
 @app.command()
 def similar(
     reference: str = typer.Argument(..., help="Asset ID or path to image"),
@@ -377,7 +484,7 @@ def similar(
 ):
     """Find visually similar assets."""
     db_path = db or find_db()
-    conn = get_db(db_path)
+    conn = get_db(db_path, read_only=True)
 
     # Get reference hash
     ref_hash = None
@@ -397,13 +504,10 @@ def similar(
         if row:
             ref_hash = row["phash"]
         elif Path(reference).exists():
+            ref_path = Path(reference).resolve()
             try:
-                import imagehash
-                from PIL import Image
-                with Image.open(reference) as img:
-                    h = imagehash.phash(img)
-                    ref_hash = h.hash.tobytes()
-                    ref_name = Path(reference).name
+                ref_hash = _file_phash(str(ref_path), ref_path.stat().st_mtime_ns)
+                ref_name = ref_path.name
             except ImportError:
                 print("Install imagehash for external file similarity: pip install imagehash", file=sys.stderr)
                 raise typer.Exit(1)
@@ -412,27 +516,35 @@ def similar(
         print(f"Could not find or compute hash for: {reference}", file=sys.stderr)
         raise typer.Exit(1)
 
-    # Find similar
-    results = []
-    for row in conn.execute("""
-        SELECT ap.asset_id, ap.phash, a.filename, a.path, p.name as pack_name
+    import phash
+
+    # Scan only (id, hash) pairs as plain tuples; paths and pack names are
+    # looked up afterwards for the few rows that make the cut
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute("""
+        SELECT ap.asset_id, ap.phash
         FROM asset_phash ap
         JOIN assets a ON ap.asset_id = a.id
-        LEFT JOIN packs p ON a.pack_id = p.id
-    """):
-        dist = hamming_distance(ref_hash, row["phash"])
-        if dist <= max_distance and dist > 0:
-            results.append((dist, row))
-
-    results.sort(key=lambda x: x[0])
-    results = results[:limit]
+        WHERE length(ap.phash) = ?
+    """, [len(ref_hash)])
+    results = phash.nearest(cursor, ref_hash, limit, max_distance, min_distance=1)
 
     if not results:
         print(f"No similar assets found for {ref_name}", file=sys.stderr)
         return
 
-    for dist, row in results:
-        print(f"{dist}\t{row['asset_id']}\t{row['path']}\t{row['pack_name'] or '-'}")
+    ids = [asset_id for _, asset_id in results]
+    details = {row["id"]: row for row in conn.execute(f"""
+        SELECT a.id, a.path, p.name as pack_name
+        FROM assets a
+        LEFT JOIN packs p ON a.pack_id = p.id
+        WHERE a.id IN ({",".join("?" * len(ids))})
+    """, ids)}
+
+    for dist, asset_id in results:
+        row = details[asset_id]
+        print(f"{dist}\t{asset_id}\t{row['path']}\t{row['pack_name'] or '-'}")
 
 
 COMMAND_HELP = {
@@ -443,12 +555,14 @@ COMMAND_HELP = {
             ("QUERY", "Search filename/path"),
         ],
         "opts": [
+            ("--starts-with", "Match QUERY as a filename prefix"),
             ("-t, --tag TAG", "Filter by tag (can repeat)"),
-            ("-c, --color COLOR", "Filter by dominant color (hex or name)"),
+            ("-c, --color COLOR", "Filter by dominant color (name, or hex incl. near shades)"),
             ("-p, --pack PACK", "Filter by pack"),
             ("--type TYPE", "Filter by filetype"),
             ("--db PATH", "Path to assets.db"),
             ("-n, --limit N", "Max results (default: 50)"),
+            ("--no-tags", "Leave the tags column empty"),
         ],
     },
     "packs": {
@@ -486,6 +600,14 @@ COMMAND_HELP = {
             ("--db PATH", "Path to assets.db"),
         ],
     },
+    "analyze": {
+        "desc": "Refresh query planner statistics",
+        "usage": "search.py analyze [OPTIONS]",
+        "args": [],
+        "opts": [
+            ("--db PATH", "Path to assets.db"),
+        ],
+    },
     "similar": {
         "desc": "Find visually similar assets",
         "usage": "search.py similar REFERENCE [OPTIONS]",
@@ -130,7 +130,8 @@ def create_cel_chunk_compressed(
     pixels: bytes,
 ) -> bytes:
     """Create a compressed cel chunk (0x2005)."""
-    compressed = zlib.compress(pixels)
+    # Fastest level: fixtures are throwaway and solid colors compress anyway
+    compressed = zlib.compress(pixels, 1)
 
     data = bytearray()
     # Layer index
@@ -221,18 +222,27 @@ def temp_dir():
         yield Path(tmpdir)
 
 
-@pytest.fixture
-def sample_aseprite(temp_dir):
+# Module scope: tests only read these files, so they are built once
+@pytest.fixture(scope="module")
+def sample_aseprite(tmp_path_factory):
     """Create a sample Aseprite file."""
-    path = temp_dir / "test.aseprite"
+    path = tmp_path_factory.mktemp("aseprite") / "test.aseprite"
     path.write_bytes(create_minimal_aseprite(32, 32, (255, 0, 0, 255)))
     return path
 
 
-@pytest.fixture
-def aseprite_with_tags(temp_dir):
+@pytest.fixture(scope="module")
+def parsed_sample_aseprite(sample_aseprite):
+    """parse_aseprite result for the sample file."""
+    import aseprite_parser
+
+    return aseprite_parser.parse_aseprite(sample_aseprite)
+
+
+@pytest.fixture(scope="module")
+def aseprite_with_tags(tmp_path_factory):
     """Create an Aseprite file with animation tags."""
-    path = temp_dir / "tagged.aseprite"
+    path = tmp_path_factory.mktemp("aseprite") / "tagged.aseprite"
     data = create_minimal_aseprite(
         32, 32,
         tags=[("idle", 0, 0), ("walk", 0, 0), ("attack", 0, 0)]
@@ -249,25 +259,19 @@ def aseprite_with_tags(temp_dir):
 class TestParseAseprite:
     """Tests for parse_aseprite function."""
 
-    def test_parses_dimensions(self, sample_aseprite):
-        import aseprite_parser
-
-        result = aseprite_parser.parse_aseprite(sample_aseprite)
+    def test_parses_dimensions(self, parsed_sample_aseprite):
+        result = parsed_sample_aseprite
 
         assert result["width"] == 32
         assert result["height"] == 32
 
-    def test_parses_frame_count(self, sample_aseprite):
-        import aseprite_parser
-
-        result = aseprite_parser.parse_aseprite(sample_aseprite)
+    def test_parses_frame_count(self, parsed_sample_aseprite):
+        result = parsed_sample_aseprite
 
         assert result["frame_count"] == 1
 
-    def test_parses_color_depth(self, sample_aseprite):
-        import aseprite_parser
-
-        result = aseprite_parser.parse_aseprite(sample_aseprite)
+    def test_parses_color_depth(self, parsed_sample_aseprite):
+        result = parsed_sample_aseprite
 
         assert result["color_depth"] == 32
 
@@ -281,10 +285,8 @@ class TestParseAseprite:
         assert "walk" in result["tags"]
         assert "attack" in result["tags"]
 
-    def test_returns_empty_tags_when_none(self, sample_aseprite):
-        import aseprite_parser
-
-        result = aseprite_parser.parse_aseprite(sample_aseprite)
+    def test_returns_empty_tags_when_none(self, parsed_sample_aseprite):
+        result = parsed_sample_aseprite
 
         assert result["tags"] == []
 
@@ -0,0 +1,306 @@
+#!/usr/bin/env -S uv run
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "pytest>=8.0",
+#     "httpx>=0.27",
+#     "rich>=13.0",
+#     "selectolax>=0.3.21",
+# ]
+# ///
+"""Tests for the itch.io preview fetcher."""
+
+import asyncio
+import functools
+import os
+import time
+
+import httpx
+import pytest
+
+import fetch_itch_previews as itch
+
+
+# =============================================================================
+# Cover Image Extraction
+# =============================================================================
+
+SCREENSHOT_HTML = (
+    '<div class="screenshot_list">'
+    '<a href="#"><img src="https://img.itch.zone/shot.png/347x500/cover.png"></a>'
+    '</div>'
+)
+GIF_HTML = '<img src="https://img.itch.zone/anim/walk.gif">'
+OG_HTML = '<meta property="og:image" content="https://img.itch.zone/og.png">'
+
+
+class TestExtractCoverImage:
+    """Tests for extract_cover_image and COVER_SELECTORS."""
+
+    def test_screenshot_list(self):
+        html = f"<html><body>{SCREENSHOT_HTML}</body></html>"
+        assert itch.extract_cover_image(html) == "https://img.itch.zone/shot.png/347x500/cover.png"
+
+    def test_itch_zone_gif(self):
+        html = f"<html><body>{GIF_HTML}</body></html>"
+        assert itch.extract_cover_image(html) == "https://img.itch.zone/anim/walk.gif"
+
+    def test_gif_must_be_on_itch_zone(self):
+        html = '<html><body><img src="https://example.com/walk.gif"></body></html>'
+        assert itch.extract_cover_image(html) is None
+
+    def test_og_image(self):
+        html = f"<html><head>{OG_HTML}</head><body></body></html>"
+        assert itch.extract_cover_image(html) == "https://img.itch.zone/og.png"
+
+    def test_selector_priority(self):
+        html = f"<html><head>{OG_HTML}</head><body>{GIF_HTML}{SCREENSHOT_HTML}</body></html>"
+        assert itch.extract_cover_image(html) == "https://img.itch.zone/shot.png/347x500/cover.png"
+        html = f"<html><head>{OG_HTML}</head><body>{GIF_HTML}</body></html>"
+        assert itch.extract_cover_image(html) == "https://img.itch.zone/anim/walk.gif"
+
+    def test_valueless_attribute_falls_through(self):
+        html = (
+            f'<html><head>{OG_HTML}</head><body>'
+            '<div class="screenshot_list"><img src></div></body></html>'
+        )
+        assert itch.extract_cover_image(html) == "https://img.itch.zone/og.png"
+
+    def test_no_match(self):
+        for html in ["", "<html><body><p>No images</p></body></html>", '<meta property="og:image">']:
+            assert itch.extract_cover_image(html) is None
+
+
+# =============================================================================
+# Download Cache
+# =============================================================================
+
+
+class FailingStream(httpx.AsyncByteStream):
+    """Response body that drops the connection after its first chunk."""
+
+    async def __aiter__(self):
+        yield b"GIF89a"
+        raise httpx.ReadError("connection reset")
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(itch, "CACHE_DIR", tmp_path)
+    return tmp_path
+
+
+def respond(*args, **kwargs):
+    """MockTransport handler that answers every request with the same response."""
+    return lambda request: httpx.Response(*args, **kwargs)
+
+
+def run_with_transport(handler, fetch, *args):
+    """Run fetch(client, *args) against a MockTransport; return (result, requested URLs)."""
+    requested = []
+
+    def record(request):
+        requested.append(str(request.url))
+        return handler(request)
+
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(record)) as client:
+            return await fetch(client, *args)
+
+    return asyncio.run(go()), requested
+
+
+class TestCache:
+    """Tests for cache_path, is_fresh, fetch_page and fetch_image."""
+
+    def test_cache_path_is_stable_per_url(self, cache_dir):
+        url = "https://krishna-palacio.itch.io/minifantasy-towns"
+        assert itch.cache_path(url, ".html") == itch.cache_path(url, ".html")
+        assert itch.cache_path(url, ".html").parent == cache_dir
+        assert itch.cache_path(url, ".html").suffix == ".html"
+        assert itch.cache_path(url, ".html") != itch.cache_path(url + "-ii", ".html")
+
+    def test_is_fresh(self, tmp_path):
+        path = tmp_path / "page.html"
+        assert not itch.is_fresh(path)
+        path.write_text("x")
+        assert itch.is_fresh(path)
+        stale = time.time() - itch.CACHE_TTL - 60
+        os.utime(path, (stale, stale))
+        assert not itch.is_fresh(path)
+
+    def test_fetch_page_reuses_fresh_cache(self, cache_dir):
+        url = "https://krishna-palacio.itch.io/minifantasy-towns"
+        handler = respond(200, text="<html>towns</html>")
+        html, requested = run_with_transport(handler, itch.fetch_page, url)
+        assert html == "<html>towns</html>"
+        assert requested == [url]
+
+        html, requested = run_with_transport(handler, itch.fetch_page, url)
+        assert html == "<html>towns</html>"
+        assert requested == []
+
+    def test_fetch_page_refetches_stale_cache(self, cache_dir):
+        url = "https://krishna-palacio.itch.io/minifantasy-towns"
+        path = itch.cache_path(url, ".html")
+        path.write_text("<html>old</html>", encoding="utf-8")
+        stale = time.time() - itch.CACHE_TTL - 60
+        os.utime(path, (stale, stale))
+
+        handler = respond(200, text="<html>new</html>")
+        html, requested = run_with_transport(handler, itch.fetch_page, url)
+        assert html == "<html>new</html>"
+        assert requested == [url]
+        assert path.read_text(encoding="utf-8") == "<html>new</html>"
+
+    def test_fetch_page_cached_text_matches_first_fetch(self, cache_dir):
+        url = "https://krishna-palacio.itch.io/minifantasy-caf"
+        body = "<html>Café</html>".encode("latin-1")
+        handler = respond(
+            200, content=body, headers={"content-type": "text/html; charset=iso-8859-1"}
+        )
+        first, _ = run_with_transport(handler, itch.fetch_page, url)
+        cached, requested = run_with_transport(handler, itch.fetch_page, url)
+        assert first == cached == "<html>Café</html>"
+        assert requested == []
+
+    def test_fetch_page_error_is_not_cached(self, cache_dir):
+        url = "https://krishna-palacio.itch.io/minifantasy-missing"
+        handler = respond(404)
+        with pytest.raises(httpx.HTTPStatusError):
+            run_with_transport(handler, itch.fetch_page, url)
+        assert not itch.cache_path(url, ".html").exists()
+
+    def test_fetch_image_streams_into_cache(self, cache_dir):
+        url = "https://img.itch.zone/cover.png"
+        handler = respond(200, content=b"PNGDATA")
+        path, requested = run_with_transport(handler, itch.fetch_image, url)
+        assert path == itch.cache_path(url, ".png")
+        assert path.read_bytes() == b"PNGDATA"
+        assert not path.with_suffix(".part").exists()
+        assert requested == [url]
+
+        again, requested = run_with_transport(handler, itch.fetch_image, url)
+        assert again == path
+        assert requested == []
+
+    def test_fetch_image_gif_from_content_type(self, cache_dir):
+        url = "https://img.itch.zone/cover"
+        handler = respond(
+            200, content=b"GIF89a", headers={"content-type": "image/gif"}
+        )
+        path, _ = run_with_transport(handler, itch.fetch_image, url)
+        assert path == itch.cache_path(url, ".gif")
+
+        # The cached .gif is found without knowing the extension up front
+        again, requested = run_with_transport(handler, itch.fetch_image, url)
+        assert again == path
+        assert requested == []
+
+    def test_fetch_image_interrupted_download_is_not_fresh(self, cache_dir):
+        url = "https://img.itch.zone/walk.gif"
+        handler = respond(200, stream=FailingStream())
+        with pytest.raises(httpx.ReadError):
+            run_with_transport(handler, itch.fetch_image, url)
+        path = itch.cache_path(url, ".gif")
+        assert not path.exists()
+        assert path.with_suffix(".part").exists()
+
+        handler = respond(200, content=b"GIF89a-full")
+        path, requested = run_with_transport(handler, itch.fetch_image, url)
+        assert path.read_bytes() == b"GIF89a-full"
+        assert requested == [url]
+
+
+# =============================================================================
+# Rate Limiting
+# =============================================================================
+
+
+def patch_client(monkeypatch, handler):
+    """Make fetch_all's AsyncClient send through a MockTransport; return request log."""
+    requested = []
+
+    def record(request):
+        requested.append((request.url.host, time.monotonic()))
+        return handler(request)
+
+    client = functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(record))
+    monkeypatch.setattr(itch.httpx, "AsyncClient", client)
+    return requested
+
+
+def page_for(request):
+    if request.url.host == "img.itch.zone":
+        return httpx.Response(200, content=b"PNGDATA")
+    name = request.url.path.rsplit("-", 1)[-1]
+    return httpx.Response(200, text=f'<meta property="og:image" content="https://img.itch.zone/{name}.png">')
+
+
+class TestRateLimit:
+    """Tests for HostRateLimiter and fetch_all pacing."""
+
+    def test_spaces_requests_to_one_host(self):
+        limiter = itch.HostRateLimiter(0.05)
+        times = []
+
+        async def one():
+            await limiter.wait(httpx.Request("GET", "https://itch.io/a"))
+            times.append(time.monotonic())
+
+        async def go():
+            await asyncio.gather(*(one() for _ in range(4)))
+
+        asyncio.run(go())
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        assert len(gaps) == 3
+        assert all(gap >= 0.045 for gap in gaps)
+
+    def test_hosts_are_limited_independently(self):
+        limiter = itch.HostRateLimiter(1.0)
+
+        async def go():
+            await asyncio.gather(*(
+                limiter.wait(httpx.Request("GET", f"https://{host}/x"))
+                for host in ["itch.io", "img.itch.zone", "example.com"]
+            ))
+
+        start = time.monotonic()
+        asyncio.run(go())
+        assert time.monotonic() - start < 0.5
+
+    def test_fetch_all_paces_network_requests_per_host(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(itch, "CACHE_DIR", tmp_path / "cache")
+        monkeypatch.setattr(itch, "MIN_REQUEST_INTERVAL", 0.05)
+        (tmp_path / "cache").mkdir()
+        requested = patch_client(monkeypatch, page_for)
+
+        names = [f"Pack{i}" for i in range(6)]
+        assert asyncio.run(itch.fetch_all(names, tmp_path)) == len(names)
+        for host in ["krishna-palacio.itch.io", "img.itch.zone"]:
+            times = [t for h, t in requested if h == host]
+            assert len(times) == len(names)
+            assert all(b - a >= 0.045 for a, b in zip(times, times[1:]))
+
+    def test_fetch_all_cache_hits_do_not_wait(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(itch, "CACHE_DIR", tmp_path / "cache")
+        (tmp_path / "cache").mkdir()
+        names = [f"Pack{i}" for i in range(40)]
+        for name in names:
+            url = itch.find_pack_url(name)
+            img_url = f"https://img.itch.zone/{name}.png"
+            itch.cache_path(url, ".html").write_text(
+                f'<meta property="og:image" content="{img_url}">', encoding="utf-8"
+            )
+            itch.cache_path(img_url, ".png").write_bytes(b"PNGDATA")
+        requested = patch_client(monkeypatch, page_for)
+
+        start = time.monotonic()
+        assert asyncio.run(itch.fetch_all(names, tmp_path)) == len(names)
+        assert time.monotonic() - start < 1.0
+        assert requested == []
+        assert (tmp_path / "Pack0.png").read_bytes() == b"PNGDATA"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
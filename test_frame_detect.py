@@ -80,11 +80,8 @@ class TestFilenameHint:
 def make_sheet(tmp_path, name, sheet_size, blobs):
     """RGBA sheet with opaque rectangles; blobs are (x0, y0, x1, y1)."""
     img = Image.new("RGBA", sheet_size, (0, 0, 0, 0))
-    px = img.load()
-    for (x0, y0, x1, y1) in blobs:
-        for x in range(x0, x1):
-            for y in range(y0, y1):
-                px[x, y] = (200, 50, 50, 255)
+    for box in blobs:
+        img.paste((200, 50, 50, 255), box)
     path = tmp_path / name
     img.save(path)
     return path
@@ -108,6 +105,10 @@ class TestInferGrid:
         with Image.open(path) as img:
             assert frame_detect.infer_grid(img) == (64, 32)
 
+    def test_edge_candidates_are_divisors_from_min_edge_to_half(self):
+        assert frame_detect._edge_candidates(96) == (8, 12, 16, 24, 32, 48)
+        assert frame_detect._edge_candidates(13) == ()
+
 
 class TestDetectPreviewBounds:
     def test_crop_confined_to_first_frame_content(self, tmp_path):
@@ -132,6 +133,10 @@ class TestDetectPreviewBounds:
         x, y, w, h = frame_detect.detect_preview_bounds(path)
         assert x >= 32 and x + w <= 64
 
+    def test_first_occupied_cell_may_be_on_a_later_row(self, tmp_path):
+        path = make_sheet(tmp_path, "32x32_sparse.png", (64, 64), [(4, 36, 10, 40)])
+        assert frame_detect.detect_preview_bounds(path) == (3, 35, 8, 6)
+
     def test_animation_info_beats_inference(self, tmp_path):
         # no transparent grid lines; declared frame size must win
         (tmp_path / "_AnimationInfo.txt").write_text("- 16x16px: all.\n")
@@ -12,6 +12,7 @@
 # ///
 """Test suite for asset index system."""
 
+import os
 import re
 import sqlite3
 import tempfile
@@ -24,6 +25,7 @@ from PIL import Image
 import index
 import search
 import asset_kinds
+import phash
 
 ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
 
@@ -60,12 +62,8 @@ def sample_image(temp_dir):
     # Create a simple 64x32 image (2 frames of 32x32)
     img = Image.new("RGBA", (64, 32), (100, 150, 50, 255))
     # Add some variation
-    for x in range(32):
-        for y in range(32):
-            img.putpixel((x, y), (100, 150, 50, 255))  # Green-ish
-    for x in range(32, 64):
-        for y in range(32):
-            img.putpixel((x, y), (50, 50, 150, 255))  # Blue-ish
+    img.paste((100, 150, 50, 255), (0, 0, 32, 32))  # Green-ish
+    img.paste((50, 50, 150, 255), (32, 0, 64, 32))  # Blue-ish
     img.save(img_path)
     return img_path
 
@@ -213,6 +211,16 @@ class TestExtractTagsFromPath:
         assert "damage" in tags
         assert "character" in tags  # "char" aliased to "character"
 
+    def test_precomputed_parts_match_path(self, temp_dir):
+        asset_path = temp_dir / "Pack" / "Creatures" / "Goblin" / "GoblinIdle.png"
+        rel_parts = asset_path.relative_to(temp_dir).parts
+
+        assert index.extract_tags_from_path(asset_path, temp_dir, rel_parts) == \
+            index.extract_tags_from_path(asset_path, temp_dir)
+        assert index.detect_pack(asset_path, temp_dir, rel_parts) == \
+            index.detect_pack(asset_path, temp_dir)
+        assert index.get_category(asset_path, temp_dir / "Pack", rel_parts[1:]) == "Creatures/Goblin"
+
 
 class TestExtractColors:
     """Tests for extract_colors function."""
@@ -236,6 +244,105 @@ class TestExtractColors:
         colors = index.extract_colors(bad_file)
         assert colors == []
 
+    def test_merges_near_identical_shades(self, temp_dir):
+        img = Image.new("RGB", (10, 10), (200, 16, 16))
+        img.paste((202, 18, 18), (0, 0, 4, 10))
+
+        colors = index.extract_colors(img)
+
+        # one bin at 100%, reported as its most frequent exact shade
+        assert colors == [("#c81010", 1.0)]
+
+    def test_anti_aliased_sprite_keeps_named_color(self, temp_dir):
+        from typer.testing import CliRunner
+        img_path = temp_dir / "assets" / "Pack" / "gem.png"
+        img_path.parent.mkdir(parents=True)
+        # pure red body with a softened edge that falls in the same bin
+        img = Image.new("RGB", (10, 10), (250, 5, 5))
+        img.paste((255, 0, 0), (2, 2, 10, 10))
+        img.save(img_path)
+
+        assert index.extract_colors(img_path) == [("#ff0000", 1.0)]
+
+        db_path = temp_dir / "assets.db"
+        index.index_directory(temp_dir / "assets", db_path)
+        result = CliRunner().invoke(search.app, ["search", "--color", "red", "--db", str(db_path)])
+        assert result.exit_code == 0, result.output
+        assert "Pack/gem.png" in result.stdout
+
+    def test_reuses_open_image(self, temp_dir):
+        img_path = temp_dir / "solid.png"
+        Image.new("RGB", (10, 10), (0, 0, 255)).save(img_path)
+
+        with Image.open(img_path) as img:
+            assert index.extract_colors(img)[0][0] == "#0000ff"
+            assert index.compute_phash(img) == index.compute_phash(img_path)
+            img.getpixel((0, 0))  # still open for the caller
+
+
+class TestImagesClosed:
+    """Indexing closes every image it opens, even when a step raises."""
+
+    @pytest.fixture
+    def opened(self, monkeypatch):
+        """File objects behind every image opened during the test."""
+        files = []
+        real_open = Image.open
+
+        def spy_open(*args, **kwargs):
+            img = real_open(*args, **kwargs)
+            files.append(img.fp)
+            return img
+
+        monkeypatch.setattr(Image, "open", spy_open)
+        return files
+
+    def _failing_colors(self, source):
+        raise RuntimeError("colors failed")
+
+    def _truncated_png(self, temp_dir):
+        path = temp_dir / "Pack" / "broken.png"
+        path.parent.mkdir(parents=True)
+        Image.effect_noise((64, 64), 64).save(path)
+        path.write_bytes(path.read_bytes()[:200])
+        return path
+
+    def _animation(self, temp_dir):
+        # Multi-frame images keep their file open after load()
+        path = temp_dir / "Pack" / "walk.gif"
+        path.parent.mkdir(parents=True)
+        frames = [Image.new("RGB", (8, 8), color) for color in ["red", "blue"]]
+        frames[0].save(path, save_all=True, append_images=frames[1:])
+        return path
+
+    def test_index_asset_closes_on_failed_load(self, temp_dir, opened):
+        path = self._truncated_png(temp_dir)
+        conn = index.get_db(temp_dir / "test.db")
+        index.index_asset(conn, path, temp_dir)
+        conn.close()
+        assert opened and all(f.closed for f in opened)
+
+    def test_index_asset_closes_when_colors_raise(self, temp_dir, opened, monkeypatch):
+        path = self._animation(temp_dir)
+        monkeypatch.setattr(index, "extract_colors", self._failing_colors)
+        conn = index.get_db(temp_dir / "test.db")
+        with pytest.raises(RuntimeError):
+            index.index_asset(conn, path, temp_dir)
+        conn.close()
+        assert opened and all(f.closed for f in opened)
+
+    def test_analyze_file_closes_on_failed_load(self, temp_dir, opened):
+        path = self._truncated_png(temp_dir)
+        index.analyze_file(path, temp_dir, temp_dir, {})
+        assert opened and all(f.closed for f in opened)
+
+    def test_analyze_file_closes_when_colors_raise(self, temp_dir, opened, monkeypatch):
+        path = self._animation(temp_dir)
+        monkeypatch.setattr(index, "extract_colors", self._failing_colors)
+        with pytest.raises(RuntimeError):
+            index.analyze_file(path, temp_dir, temp_dir, {})
+        assert opened and all(f.closed for f in opened)
+
 
 class TestFrameAwareIndexing:
     """Indexing stores frame-confined preview bounds."""
@@ -249,16 +356,14 @@ class TestFrameAwareIndexing:
         # 4 frames of 32x32; sprite at (4,4)-(27,27) in every frame
         img = Image.new("RGBA", (128, 32), (0, 0, 0, 0))
         for f in range(4):
-            for x in range(4, 28):
-                for y in range(4, 28):
-                    img.putpixel((f * 32 + x, y), (50, 120, 50, 255))
+            img.paste((50, 120, 50, 255), (f * 32 + 4, 4, f * 32 + 28, 28))
         img.save(pack / "GoblinIdle.png")
         return pack
 
     def test_bounds_use_declared_frame_size(self, temp_dir):
         self._make_pack(temp_dir)
         db_path = temp_dir / "t.db"
-        index.index(temp_dir, db_path, force=False)
+        index.index_directory(temp_dir, db_path, force=False)
         conn = sqlite3.connect(db_path)
         conn.row_factory = sqlite3.Row
         row = conn.execute(
@@ -275,12 +380,10 @@ class TestFrameAwareIndexing:
         # montage generation needs at least 4 png assets in the pack
         for name in ["A.png", "B.png", "C.png"]:
             img = Image.new("RGBA", (32, 32), (0, 0, 0, 0))
-            for x in range(8, 24):
-                for y in range(8, 24):
-                    img.putpixel((x, y), (120, 50, 50, 255))
+            img.paste((120, 50, 50, 255), (8, 8, 24, 24))
             img.save(pack / name)
         db_path = temp_dir / "t.db"
-        index.index(temp_dir, db_path, force=False)
+        index.index_directory(temp_dir, db_path, force=False)
         conn = sqlite3.connect(db_path)
         conn.row_factory = sqlite3.Row
         row = conn.execute(
@@ -292,12 +395,12 @@ class TestFrameAwareIndexing:
         # deleting the montage file proves force re-creates it
         montage = temp_dir / row["preview_path"].replace("previews/", ".index/previews/")
         montage.unlink()
-        index.index(temp_dir, db_path, force=True)
+        index.index_directory(temp_dir, db_path, force=True)
         assert montage.exists()
 
     def test_reindex_skips_board_with_no_directory_on_disk(self, sample_asset_pack, temp_dir):
         db_path = temp_dir / "t.db"
-        index.index(sample_asset_pack, db_path, force=False)
+        index.index_directory(sample_asset_pack, db_path, force=False)
         conn = sqlite3.connect(db_path)
         conn.row_factory = sqlite3.Row
         # empty board: DB row exists, but its dir was never created on disk
@@ -308,7 +411,7 @@ class TestFrameAwareIndexing:
         conn.commit()
         conn.close()
         # must not raise FileNotFoundError on the missing board directory
-        index.index(sample_asset_pack, db_path, force=False)
+        index.index_directory(sample_asset_pack, db_path, force=False)
         conn = sqlite3.connect(db_path)
         conn.row_factory = sqlite3.Row
         row = conn.execute(
@@ -326,6 +429,9 @@ class TestComputePhash:
         phash = index.compute_phash(sample_image)
         assert isinstance(phash, bytes)
 
+    def test_packs_eight_bits_per_byte(self, sample_image):
+        assert len(index.compute_phash(sample_image)) == 8
+
     def test_similar_images_similar_hash(self, temp_dir):
         # Create two similar images
         img1_path = temp_dir / "img1.png"
@@ -426,6 +532,15 @@ class TestHammingDistance:
         h2 = b"\xff"
         assert search.hamming_distance(h1, h2) == 8
 
+    def test_packed_64bit_hashes(self):
+        h1 = bytes.fromhex("00ff00ff00ff00ff")
+        h2 = bytes.fromhex("01ff00ff00ff00fe")
+        assert search.hamming_distance(h1, h2) == 2
+
+    def test_rejects_mismatched_lengths(self):
+        with pytest.raises(ValueError):
+            search.hamming_distance(b"\x00" * 8, b"\x00" * 64)
+
 
 class TestHexToRgb:
     """Tests for hex_to_rgb function."""
@@ -442,6 +557,11 @@ class TestHexToRgb:
         result = search.hex_to_rgb("#FfAa00")
         assert result == (255, 170, 0)
 
+    def test_rejects_malformed(self):
+        for bad in ["#fff", "ff_fff", "+fffff", "ff ff ", "#zzzzzz"]:
+            with pytest.raises(ValueError):
+                search.hex_to_rgb(bad)
+
 
 class TestColorDistance:
     """Tests for color_distance function."""
@@ -454,6 +574,100 @@ class TestColorDistance:
         assert dist > 0
 
 
+# =============================================================================
+# Unit Tests: phash.py
+# =============================================================================
+
+
+class TestPhash:
+    """Tests for pack_bits, hamming_batch and nearest."""
+
+    def _popcount_paths(self, monkeypatch):
+        """Run the caller's checks with np.bitwise_count, then with the lookup table."""
+        yield "bitwise_count"
+        monkeypatch.delattr(phash.np, "bitwise_count", raising=False)
+        yield "lut"
+
+    def _hash_table(self, rows):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE h (asset_id INTEGER, phash BLOB)")
+        conn.executemany("INSERT INTO h VALUES (?, ?)", rows)
+        return conn
+
+    def test_pack_bits_from_bool_array(self):
+        bits = [False] * 64
+        bits[0] = bits[63] = True
+        assert phash.pack_bits(bits) == bytes.fromhex("8000000000000001")
+
+    def test_pack_bits_from_legacy_blob(self):
+        blob = bytes([1] + [0] * 62 + [1])
+        assert phash.pack_bits(blob) == bytes.fromhex("8000000000000001")
+        assert phash.pack_bits(bytearray(blob)) == phash.pack_bits(memoryview(blob))
+
+    def test_hamming_batch_matches_bit_count(self, monkeypatch):
+        for path in self._popcount_paths(monkeypatch):
+            for length in [1, 3, 8, 16, 32]:
+                ref = bytes(range(7, 7 + length))
+                hashes = [bytes(length), ref, bytes([0xFF] * length), bytes(range(length))]
+                expected = [
+                    sum(bin(a ^ b).count("1") for a, b in zip(h, ref)) for h in hashes
+                ]
+                dists = phash.hamming_batch(b"".join(hashes), ref)
+                assert dists.tolist() == expected, (path, length)
+
+    def test_hamming_batch_single_hash(self, monkeypatch):
+        for path in self._popcount_paths(monkeypatch):
+            dists = phash.hamming_batch(bytes.fromhex("ff00"), bytes.fromhex("0f00"))
+            assert dists.tolist() == [4], path
+
+    def test_nearest_limit_smaller_than_batch(self):
+        ref = bytes(8)
+        conn = self._hash_table([
+            (i, (2 ** i - 1).to_bytes(8, "big")) for i in [12, 3, 40, 7, 1, 25, 0, 9]
+        ])
+        cursor = conn.execute("SELECT asset_id, phash FROM h")
+        results = phash.nearest(cursor, ref, limit=3, max_distance=64)
+        assert results == [(0, 0), (1, 1), (3, 3)]
+
+    def test_nearest_merges_across_batches(self, monkeypatch):
+        ref = bytes(8)
+        rows = [(i, (2 ** (i % 50) - 1).to_bytes(8, "big")) for i in range(100, 0, -1)]
+        for path in self._popcount_paths(monkeypatch):
+            for batch_size in [1, 2, 7, 30]:
+                cursor = self._hash_table(rows).execute("SELECT asset_id, phash FROM h")
+                results = phash.nearest(cursor, ref, limit=4, max_distance=64, batch_size=batch_size)
+                assert results == [(0, 50), (0, 100), (1, 1), (1, 51)], (path, batch_size)
+
+    def test_nearest_keeps_closest_within_range(self):
+        ref = bytes(8)
+        conn = self._hash_table([
+            (1, ref), (2, bytes.fromhex("0f00000000000000")), (3, bytes.fromhex("0100000000000001")),
+            (4, bytes.fromhex("0100000000000000")), (5, bytes.fromhex("ffffffffffffffff")),
+        ])
+        cursor = conn.execute("SELECT asset_id, phash FROM h")
+        results = phash.nearest(cursor, ref, limit=2, max_distance=15, min_distance=1, batch_size=5)
+        assert results == [(1, 4), (2, 3)]
+
+    def test_nearest_breaks_ties_by_lowest_id(self):
+        tied = bytes.fromhex("0100000000000000")
+        conn = self._hash_table([(i, tied) for i in [9, 4, 7, 2, 8, 5, 3, 6]])
+        for batch_size in [1, 3, 8, 1024]:
+            cursor = conn.execute("SELECT asset_id, phash FROM h")
+            results = phash.nearest(cursor, bytes(8), limit=3, max_distance=5, batch_size=batch_size)
+            assert results == [(1, 2), (1, 3), (1, 4)], batch_size
+
+    def test_nearest_respects_distance_range(self):
+        ref = bytes(8)
+        conn = self._hash_table([(i, (2 ** i - 1).to_bytes(8, "big")) for i in range(10)])
+        cursor = conn.execute("SELECT asset_id, phash FROM h")
+        results = phash.nearest(cursor, ref, limit=10, max_distance=5, min_distance=2, batch_size=3)
+        assert results == [(2, 2), (3, 3), (4, 4), (5, 5)]
+
+    def test_nearest_empty_cursor(self):
+        cursor = self._hash_table([]).execute("SELECT asset_id, phash FROM h")
+        assert phash.nearest(cursor, bytes(8), limit=5, max_distance=64) == []
+
+
 # =============================================================================
 # Integration Tests
 # =============================================================================
@@ -684,6 +898,165 @@ class TestCLI:
         assert result.exit_code == 0
         assert "No packs indexed" in strip_ansi(result.output)
 
+    def test_search_by_color_name(self, temp_dir):
+        from typer.testing import CliRunner
+        db_path = temp_dir / "test.db"
+        conn = search.get_db(db_path)
+        conn.execute(
+            "INSERT INTO assets (id, path, filename, filetype, file_hash) VALUES "
+            "(1, 'p/red.png', 'red.png', 'png', 'a'), (2, 'p/blue.png', 'blue.png', 'png', 'b')"
+        )
+        conn.execute("INSERT INTO asset_colors VALUES (1, '#cc0000', 0.5), (2, '#0000ff', 0.5)")
+        conn.commit()
+        conn.close()
+
+        result = CliRunner().invoke(search.app, ["search", "--color", "red", "--db", str(db_path)])
+        assert result.exit_code == 0
+        assert "p/red.png" in result.stdout
+        assert "p/blue.png" not in result.stdout
+
+    def test_search_prints_tags(self, temp_dir):
+        from typer.testing import CliRunner
+        db_path = temp_dir / "test.db"
+        conn = search.get_db(db_path)
+        conn.execute(
+            "INSERT INTO assets (id, path, filename, filetype, file_hash) VALUES "
+            "(1, 'p/goblin.png', 'goblin.png', 'png', 'a'), (2, 'p/goblin2.png', 'goblin2.png', 'png', 'b')"
+        )
+        conn.execute("INSERT INTO tags (id, name) VALUES (1, 'goblin'), (2, 'idle')")
+        conn.execute("INSERT INTO asset_tags VALUES (1, 1, 'path'), (1, 2, 'path')")
+        conn.commit()
+        conn.close()
+
+        result = CliRunner().invoke(search.app, ["search", "goblin", "--db", str(db_path)])
+        assert result.exit_code == 0
+        lines = [line.split("\t") for line in result.stdout.splitlines()]
+        assert [line[0] for line in lines] == ["1", "2"]
+        assert sorted(lines[0][4].split(",")) == ["goblin", "idle"]
+        assert lines[1][4] == ""
+
+        result = CliRunner().invoke(search.app, ["search", "goblin", "--no-tags", "--db", str(db_path)])
+        assert result.exit_code == 0
+        assert [line.split("\t")[4] for line in result.stdout.splitlines()] == ["", ""]
+
+    def test_similar_orders_by_distance(self, temp_dir):
+        from typer.testing import CliRunner
+        db_path = temp_dir / "test.db"
+        conn = search.get_db(db_path)
+        for asset_id, flipped in [(1, 0), (2, 3), (3, 1), (4, 40)]:
+            conn.execute(
+                "INSERT INTO assets (id, path, filename, filetype, file_hash) VALUES (?, ?, ?, 'png', ?)",
+                [asset_id, f"p/{asset_id}.png", f"{asset_id}.png", str(asset_id)],
+            )
+            conn.execute(
+                "INSERT INTO asset_phash VALUES (?, ?)",
+                [asset_id, ((1 << flipped) - 1).to_bytes(8, "big")],
+            )
+        conn.commit()
+        conn.close()
+
+        result = CliRunner().invoke(search.app, ["similar", "1", "--db", str(db_path)])
+        assert result.exit_code == 0
+        lines = [line.split("\t")[:2] for line in result.stdout.splitlines()]
+        assert lines == [["1", "3"], ["3", "2"]]
+
+    def test_find_db_prefers_env(self, temp_dir, monkeypatch):
+        monkeypatch.setenv("ASSETS_DB", str(temp_dir / "elsewhere.db"))
+        assert search.find_db() == temp_dir / "elsewhere.db"
+
+    def test_find_db_follows_databases_created_and_removed(self, temp_dir, monkeypatch):
+        nested = temp_dir / "project" / "sub"
+        nested.mkdir(parents=True)
+        monkeypatch.chdir(nested)
+        monkeypatch.delenv("ASSETS_DB", raising=False)
+        outer = temp_dir / "assets.db"
+        outer.touch()
+        assert search.find_db() == outer
+
+        inner = nested / "assets.db"
+        inner.touch()
+        assert search.find_db() == inner
+
+        inner.unlink()
+        assert search.find_db() == outer
+
+    def test_search_starts_with_is_literal_prefix(self, temp_dir):
+        from typer.testing import CliRunner
+        db_path = temp_dir / "test.db"
+        conn = search.get_db(db_path)
+        conn.executemany(
+            "INSERT INTO assets (path, filename, filetype, file_hash) VALUES (?, ?, 'png', ?)",
+            [("p/Gob_Idle.png", "Gob_Idle.png", "a"), ("p/gobXidle.png", "gobXidle.png", "b"),
+             ("p/big_gob_x.png", "big_gob_x.png", "c")],
+        )
+        conn.commit()
+        conn.close()
+
+        result = CliRunner().invoke(search.app, ["search", "gob_", "--starts-with", "--db", str(db_path)])
+        assert result.exit_code == 0
+        assert [line.split("\t")[1] for line in result.stdout.splitlines()] == ["p/Gob_Idle.png"]
+
+    def test_search_requires_every_tag(self, temp_dir):
+        from typer.testing import CliRunner
+        db_path = temp_dir / "test.db"
+        conn = search.get_db(db_path)
+        conn.execute(
+            "INSERT INTO assets (id, path, filename, filetype, file_hash) VALUES "
+            "(1, 'p/a.png', 'a.png', 'png', 'a'), (2, 'p/b.png', 'b.png', 'png', 'b')"
+        )
+        conn.execute("INSERT INTO tags (id, name) VALUES (1, 'goblin'), (2, 'idle')")
+        conn.execute("INSERT INTO asset_tags VALUES (1, 1, 'path'), (1, 2, 'path'), (2, 1, 'path')")
+        conn.commit()
+        conn.close()
+
+        runner = CliRunner()
+        result = runner.invoke(search.app, ["search", "-t", "Goblin", "-t", "idle", "-t", "idle", "--db", str(db_path)])
+        assert result.exit_code == 0
+        assert [line.split("\t")[0] for line in result.stdout.splitlines()] == ["1"]
+
+    def test_search_by_hex_matches_near_shades(self, temp_dir):
+        from typer.testing import CliRunner
+        db_path = temp_dir / "test.db"
+        conn = search.get_db(db_path)
+        conn.execute(
+            "INSERT INTO assets (id, path, filename, filetype, file_hash) VALUES "
+            "(1, 'p/a.png', 'a.png', 'png', 'a'), (2, 'p/b.png', 'b.png', 'png', 'b')"
+        )
+        conn.execute("INSERT INTO asset_colors VALUES (1, '#fa5203', 0.5), (2, '#e05500', 0.5)")
+        conn.commit()
+        conn.close()
+
+        result = CliRunner().invoke(search.app, ["search", "--color", "#FF5500", "--db", str(db_path)])
+        assert result.exit_code == 0
+        assert "p/a.png" in result.stdout
+        assert "p/b.png" not in result.stdout
+
+    def test_search_rejects_malformed_hex(self, temp_dir):
+        from typer.testing import CliRunner
+        db_path = temp_dir / "test.db"
+        search.get_db(db_path).close()
+
+        for bad in ["+1+1+1", "#12345678", "ff ff f"]:
+            with pytest.raises(ValueError):
+                search.lattice_index(bad)
+            result = CliRunner().invoke(search.app, ["search", "--color", bad, "--db", str(db_path)])
+            assert result.exit_code == 2
+            assert "Unknown color" in result.output
+
+    def test_search_tags_counts(self, temp_dir):
+        from typer.testing import CliRunner
+        db_path = temp_dir / "test.db"
+        conn = search.get_db(db_path)
+        conn.execute("INSERT INTO tags (id, name) VALUES (1, 'goblin'), (2, 'idle'), (3, 'gone')")
+        conn.execute("INSERT INTO asset_tags VALUES (1, 1, 'path'), (2, 1, 'path'), (2, 2, 'path'), (3, 3, 'path')")
+        conn.execute("DELETE FROM asset_tags WHERE tag_id = 3")
+        conn.commit()
+        conn.close()
+
+        result = CliRunner().invoke(search.app, ["tags", "--db", str(db_path)])
+        assert result.exit_code == 0
+        assert result.stdout.splitlines() == ["goblin\t2", "idle\t1"]
+
     def test_search_tags_empty(self, temp_dir):
         """Test tags command with empty database."""
         from typer.testing import CliRunner
@@ -696,6 +1069,20 @@ class TestCLI:
         assert result.exit_code == 0
         assert "No tags found" in strip_ansi(result.output)
 
+    def test_search_analyze_writes_stats(self, temp_dir):
+        from typer.testing import CliRunner
+        db_path = temp_dir / "test.db"
+        conn = search.get_db(db_path)
+        conn.execute("INSERT INTO assets (path, filename, filetype, file_hash) VALUES ('a.png', 'a.png', 'png', 'a')")
+        conn.commit()
+        conn.close()
+
+        result = CliRunner().invoke(search.app, ["analyze", "--db", str(db_path)])
+        assert result.exit_code == 0
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+        conn.close()
+
 
 # =============================================================================
 # Sprite Frames Schema Tests
@@ -711,9 +1098,7 @@ class TestIndexAssetPreviewBounds:
         img_path.parent.mkdir(parents=True)
         # Create 64x32 spritesheet with first sprite at (0,0) size 32x32
         img = Image.new("RGBA", (64, 32), (0, 0, 0, 0))
-        for x in range(32):
-            for y in range(32):
-                img.putpixel((x, y), (255, 0, 0, 255))
+        img.paste((255, 0, 0, 255), (0, 0, 32, 32))
         img.save(img_path)
 
         db_path = temp_dir / "test.db"
@@ -1079,6 +1464,52 @@ class TestSchemaMigration:
         cols = {r["name"] for r in conn.execute("PRAGMA table_info(assets)")}
         assert "asset_kind" in cols
 
+    def test_legacy_asset_tags_backfills_tag_counts(self, tmp_path):
+        db_path = tmp_path / "test.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE asset_tags (asset_id INTEGER, tag_id INTEGER, source TEXT, PRIMARY KEY (asset_id, tag_id))")
+        conn.execute("INSERT INTO asset_tags VALUES (1, 7, 'path'), (2, 7, 'path'), (2, 8, 'path')")
+        conn.commit()
+        conn.close()
+
+        conn = index.get_db(db_path)
+        conn.execute("INSERT INTO asset_tags VALUES (3, 8, 'user')")
+        conn.execute("DELETE FROM asset_tags WHERE asset_id = 1")
+        counts = dict(conn.execute("SELECT tag_id, count FROM tag_counts").fetchall())
+        assert counts == {7: 1, 8: 2}
+
+    def test_legacy_asset_colors_gets_palette_idx(self, tmp_path):
+        db_path = tmp_path / "test.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("""
+            CREATE TABLE asset_colors (
+                asset_id INTEGER, color_hex TEXT, percentage REAL,
+                PRIMARY KEY (asset_id, color_hex)
+            )
+        """)
+        conn.execute("INSERT INTO asset_colors VALUES (1, '#cc0000', 0.5), (1, '#123456', 0.2)")
+        conn.commit()
+        conn.close()
+
+        conn = index.get_db(db_path)
+        rows = dict(conn.execute("SELECT color_hex, palette_idx FROM asset_colors").fetchall())
+        assert rows == {"#cc0000": search.PALETTE_IDX["red"], "#123456": None}
+        nearest = conn.execute("SELECT nearest_palette FROM asset_colors WHERE color_hex = '#123456'").fetchone()[0]
+        assert nearest == search.lattice_index("#123456")
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == index.SCHEMA_VERSION
+
+    def test_legacy_unpacked_phash_is_packed(self, tmp_path):
+        db_path = tmp_path / "test.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE asset_phash (asset_id INTEGER PRIMARY KEY, phash BLOB)")
+        conn.execute("INSERT INTO asset_phash VALUES (1, ?)", [bytes([1] * 3 + [0] * 61)])
+        conn.commit()
+        conn.close()
+
+        conn = index.get_db(db_path)
+        packed = conn.execute("SELECT phash FROM asset_phash").fetchone()[0]
+        assert packed == bytes([0b11100000]) + bytes(7)
+
 
 class TestSearchSchema:
     def test_packs_table_has_theme_column(self, tmp_path):
@@ -1087,6 +1518,28 @@ class TestSearchSchema:
         cols = {r["name"] for r in conn.execute("PRAGMA table_info(packs)")}
         assert "theme" in cols
 
+    def test_read_only_connection_rejects_writes(self, tmp_path):
+        db_path = tmp_path / "test.db"
+        search.get_db(db_path).close()
+        conn = search.get_db(db_path, read_only=True)
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO tags (name) VALUES ('x')")
+
+    def test_schema_version_matches_index(self):
+        assert search.SCHEMA_VERSION == index.SCHEMA_VERSION
+
+    def test_read_only_rejects_outdated_index(self, tmp_path):
+        db_path = tmp_path / "test.db"
+        conn = search.get_db(db_path)
+        conn.execute("PRAGMA user_version = 0")
+        conn.close()
+        with pytest.raises(typer.BadParameter, match="index.py update"):
+            search.get_db(db_path, read_only=True)
+
+    def test_read_only_creates_missing_db(self, tmp_path):
+        conn = search.get_db(tmp_path / "new.db", read_only=True)
+        assert conn.execute("SELECT COUNT(*) FROM assets").fetchone()[0] == 0
+
 
 # =============================================================================
 # 3D End-to-End Tests
@@ -1205,6 +1658,137 @@ class TestAnimationBundleLinking:
         assert cross["n"] == 0
 
 
+class TestBulkIndex:
+    def test_bulk_rebuilds_dropped_indexes(self, tmp_path):
+        from index import app
+        img_path = tmp_path / "assets" / "Pack" / "slime.png"
+        img_path.parent.mkdir(parents=True)
+        Image.new("RGB", (16, 16), (255, 0, 0)).save(img_path)
+        db_path = tmp_path / "assets.db"
+        index.get_db(db_path).close()
+        conn = sqlite3.connect(db_path)
+        before = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index'").fetchall()
+        conn.close()
+
+        result = typer.testing.CliRunner().invoke(
+            app, ["index", str(tmp_path / "assets"), "--db", str(db_path), "--bulk"]
+        )
+        assert result.exit_code == 0, result.stdout
+
+        conn = sqlite3.connect(db_path)
+        after = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index'").fetchall()
+        assert sorted(after) == sorted(before)
+        assert conn.execute("SELECT COUNT(*) FROM asset_colors").fetchone()[0] == 1
+
+    def test_update_never_drops_indexes(self, tmp_path, monkeypatch):
+        from index import app
+        img_path = tmp_path / "assets" / "Pack" / "slime.png"
+        img_path.parent.mkdir(parents=True)
+        Image.new("RGB", (16, 16), (255, 0, 0)).save(img_path)
+        db_path = tmp_path / "assets.db"
+        runner = typer.testing.CliRunner()
+        result = runner.invoke(app, ["index", str(tmp_path / "assets"), "--db", str(db_path)])
+        assert result.exit_code == 0, result.stdout
+
+        def fail(conn):
+            raise AssertionError("update dropped secondary indexes")
+        monkeypatch.setattr(index, "drop_secondary_indexes", fail)
+        result = runner.invoke(app, ["update", "--db", str(db_path)])
+        assert result.exit_code == 0, result.stdout
+        assert "Rebuilding indexes" not in result.stdout
+
+
+class TestReindexChangedFile:
+    def test_keeps_asset_id_and_user_tags_and_replaces_colors(self, tmp_path):
+        from index import app
+        img_path = tmp_path / "assets" / "Pack" / "slime.png"
+        img_path.parent.mkdir(parents=True)
+        Image.new("RGB", (16, 16), (255, 0, 0)).save(img_path)
+        db_path = tmp_path / "assets.db"
+        runner = typer.testing.CliRunner()
+        runner.invoke(app, ["index", str(tmp_path / "assets"), "--db", str(db_path)])
+
+        conn = index.get_db(db_path)
+        asset_id = conn.execute("SELECT id FROM assets").fetchone()[0]
+        conn.execute("INSERT INTO tags (name) VALUES ('favorite')")
+        conn.execute(
+            "INSERT INTO asset_tags SELECT ?, id, 'user' FROM tags WHERE name = 'favorite'", [asset_id]
+        )
+        conn.commit()
+        conn.close()
+
+        Image.new("RGB", (16, 16), (0, 0, 255)).save(img_path)
+        result = runner.invoke(app, ["index", str(tmp_path / "assets"), "--db", str(db_path)])
+        assert result.exit_code == 0, result.stdout
+
+        conn = index.get_db(db_path)
+        assert [r[0] for r in conn.execute("SELECT id FROM assets")] == [asset_id]
+        colors = conn.execute("SELECT color_hex FROM asset_colors WHERE asset_id = ?", [asset_id]).fetchall()
+        assert [c[0] for c in colors] == ["#0000ff"]
+        tags = {r[0] for r in conn.execute(
+            "SELECT t.name FROM asset_tags at JOIN tags t ON t.id = at.tag_id WHERE at.asset_id = ?", [asset_id]
+        )}
+        assert {"favorite", "slime"} <= tags
+
+
+class TestStatSkip:
+    def _index(self, tmp_path):
+        from index import app
+        result = typer.testing.CliRunner().invoke(
+            app, ["index", str(tmp_path / "assets"), "--db", str(tmp_path / "assets.db")]
+        )
+        assert result.exit_code == 0, result.stdout
+
+    def _make(self, tmp_path):
+        img_path = tmp_path / "assets" / "Pack" / "slime.png"
+        img_path.parent.mkdir(parents=True)
+        Image.new("RGB", (16, 16), (255, 0, 0)).save(img_path)
+        return img_path
+
+    def test_unchanged_stat_skips_hashing(self, tmp_path, monkeypatch):
+        img_path = self._make(tmp_path)
+        self._index(tmp_path)
+        conn = index.get_db(tmp_path / "assets.db")
+        stored = conn.execute("SELECT file_mtime_ns FROM assets").fetchone()[0]
+        conn.close()
+        assert stored == img_path.stat().st_mtime_ns
+
+        def fail(path):
+            raise AssertionError(f"re-hashed {path}")
+        monkeypatch.setattr(index, "file_hash", fail)
+        self._index(tmp_path)
+
+    def test_touched_file_is_hashed_once_then_skipped(self, tmp_path, monkeypatch):
+        img_path = self._make(tmp_path)
+        self._index(tmp_path)
+        st = img_path.stat()
+        os.utime(img_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+        hashed = []
+        real_hash = index.file_hash
+        monkeypatch.setattr(index, "file_hash", lambda p: hashed.append(p) or real_hash(p))
+        self._index(tmp_path)
+        assert hashed == [img_path]
+        conn = index.get_db(tmp_path / "assets.db")
+        assert conn.execute("SELECT file_mtime_ns FROM assets").fetchone()[0] == st.st_mtime_ns + 10**9
+        conn.close()
+
+        self._index(tmp_path)
+        assert hashed == [img_path]
+
+    def test_legacy_assets_table_gains_mtime_column(self, tmp_path):
+        db_path = tmp_path / "legacy.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("""CREATE TABLE assets (id INTEGER PRIMARY KEY, pack_id INTEGER,
+            path TEXT NOT NULL UNIQUE, filename TEXT NOT NULL, filetype TEXT NOT NULL,
+            file_hash TEXT NOT NULL, file_size INTEGER, category TEXT)""")
+        conn.close()
+        conn = index.get_db(db_path)
+        cols = {r["name"] for r in conn.execute("PRAGMA table_info(assets)")}
+        assert "file_mtime_ns" in cols
+        conn.close()
+
+
 class TestPackContentsConvention:
     def test_pack_with_contents_png_uses_it_not_montage(self, tmp_path):
         from PIL import Image as PILImage
@@ -1325,7 +1909,7 @@ class TestPackIdStability:
         img = Image.new("RGBA", (32, 32), (90, 40, 120, 255))
         img.save(pack / "a.png")
         db_path = temp_dir / "t.db"
-        index.index(temp_dir, db_path, force=False)
+        index.index_directory(temp_dir, db_path, force=False)
 
         conn = sqlite3.connect(db_path)
         conn.row_factory = sqlite3.Row
@@ -1336,7 +1920,7 @@ class TestPackIdStability:
         conn.close()
 
         # forced reindex rewrites every pack row; ids and tags must survive
-        index.index(temp_dir, db_path, force=True)
+        index.index_directory(temp_dir, db_path, force=True)
 
         conn = sqlite3.connect(db_path)
         conn.row_factory = sqlite3.Row
@@ -1545,6 +2129,29 @@ class TestFontPackPreview:
         assert preview is not None
 
 
+class TestPreviewCandidates:
+    def test_caps_each_pack_and_prefers_idle(self, tmp_path):
+        for pack_name in ("PackA", "PackB"):
+            pack = tmp_path / "assets" / pack_name
+            pack.mkdir(parents=True)
+            for name in ("a_walk", "b_run", "z_Idle"):
+                Image.new("RGBA", (8, 8), (200, 0, 0, 255)).save(pack / f"{name}.png")
+        db_path = tmp_path / "assets.db"
+        runner = typer.testing.CliRunner()
+        from index import app
+        result = runner.invoke(app, ["index", str(tmp_path / "assets"), "--db", str(db_path)])
+        assert result.exit_code == 0, result.stdout
+        conn = index.get_db(db_path)
+
+        candidates = index.preview_candidates(conn, 2)
+        assert len(candidates) == 2
+        for rows in candidates.values():
+            assert [r["filename"] for r in rows] == ["z_Idle.png", "a_walk.png"]
+
+        pack_id = next(iter(candidates))
+        assert list(index.preview_candidates(conn, 2, pack_id)) == [pack_id]
+
+
 # =============================================================================
 # Entry point
 # =============================================================================
@@ -6,11 +6,13 @@
 #     "uvicorn>=0.27",
 #     "pillow>=10.0",
 #     "python-multipart>=0.0.9",
+#     "numpy>=1.24",
 # ]
 # ///
 """Web API for asset search."""
 
 import io
+import os
 import sqlite3
 import sys
 import zipfile
@@ -29,6 +31,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 sys.path.insert(0, str(Path(__file__).parent))
 import aseprite_parser
 import model_indexer
+import phash
 import boards as boards_mod
 
 app = FastAPI(title="Asset Search API")
@@ -127,11 +130,21 @@ def get_db() -> sqlite3.Connection:
     path = _db_path or find_db()
     conn = sqlite3.connect(path)
     conn.row_factory = sqlite3.Row
+    # WAL lets requests read while index.py writes; mmap + cache for the scans
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA mmap_size = 268435456")
+    conn.execute("PRAGMA cache_size = -65536")
+    conn.execute("PRAGMA temp_store = MEMORY")
     return conn
 
 
 def find_db() -> Path:
-    """Find assets.db in current directory or parent directories."""
+    """Find assets.db via $ASSETS_DB, else in current or parent directories."""
+    if env_path := os.environ.get("ASSETS_DB"):
+        return Path(env_path)
+    # Walked per request, uncached, so a database created, moved or
+    # deleted while the server runs is picked up; set_db_path skips this
     current = Path.cwd()
     for parent in [current] + list(current.parents):
         db_path = parent / "assets.db"
@@ -274,15 +287,11 @@ def search(
                a.preview_x, a.preview_y, a.preview_width, a.preview_height,
                a.asset_kind, a.rig, a.thumbnail_path, a.file_size,
                p.name as pack_name,
-               GROUP_CONCAT(DISTINCT tg.name) as tags,
                po.use_full_image
         FROM assets a
         LEFT JOIN packs p ON a.pack_id = p.id
-        LEFT JOIN asset_tags at ON a.id = at.asset_id
-        LEFT JOIN tags tg ON at.tag_id = tg.id
         LEFT JOIN asset_preview_overrides po ON a.path = po.path
         WHERE {where}
-        GROUP BY a.id
         ORDER BY {order_by}
         LIMIT ? OFFSET ?
     """
@@ -290,6 +299,15 @@ def search(
     params.append(offset)
 
     rows = conn.execute(sql, params).fetchall()
+
+    # Second pass: tags for this page only, not for every filtered row
+    ids = [row["id"] for row in rows]
+    tags_by_id = dict(conn.execute(f"""
+        SELECT at.asset_id, GROUP_CONCAT(tg.name)
+        FROM asset_tags at JOIN tags tg ON at.tag_id = tg.id
+        WHERE at.asset_id IN ({",".join("?" * len(ids))})
+        GROUP BY at.asset_id
+    """, ids).fetchall())
     conn.close()
 
     assets = []
@@ -302,7 +320,7 @@ def search(
             "path": row["path"],
             "filename": row["filename"],
             "pack": row["pack_name"],
-            "tags": row["tags"].split(",") if row["tags"] else [],
+            "tags": tags_by_id[row["id"]].split(",") if row["id"] in tags_by_id else [],
             "width": row["width"],
             "height": row["height"],
             "preview_x": row["preview_x"],
@@ -319,11 +337,6 @@ def search(
     return {"assets": assets, "total": len(assets)}
 
 
-def hamming_distance(h1: bytes, h2: bytes) -> int:
-    """Calculate hamming distance between two hashes."""
-    return sum(bin(a ^ b).count("1") for a, b in zip(h1, h2))
-
-
 @app.get("/api/similar/{asset_id}")
 def similar(
     asset_id: int,
@@ -344,29 +357,31 @@ def similar(
 
     ref_hash = row["phash"]
 
-    # Find similar
-    results = []
-    for row in conn.execute("""
-        SELECT ap.asset_id, ap.phash, a.filename, a.path, p.name as pack_name,
-               a.width, a.height
+    # Vectorized scan over (id, hash) tuples, then details for the top hits only
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute("""
+        SELECT ap.asset_id, ap.phash
         FROM asset_phash ap
         JOIN assets a ON ap.asset_id = a.id
-        LEFT JOIN packs p ON a.pack_id = p.id
-        WHERE ap.asset_id != ?
-    """, [asset_id]):
-        dist = hamming_distance(ref_hash, row["phash"])
-        if dist <= distance:
-            results.append((dist, row))
+        WHERE ap.asset_id != ? AND length(ap.phash) = ?
+    """, [asset_id, len(ref_hash)])
+    results = phash.nearest(cursor, ref_hash, limit, distance)
 
+    ids = [rid for _, rid in results]
+    details = {r["id"]: r for r in conn.execute(f"""
+        SELECT a.id, a.filename, a.path, p.name as pack_name, a.width, a.height
+        FROM assets a
+        LEFT JOIN packs p ON a.pack_id = p.id
+        WHERE a.id IN ({",".join("?" * len(ids))})
+    """, ids)}
     conn.close()
 
-    results.sort(key=lambda x: x[0])
-    results = results[:limit]
-
     assets = []
-    for dist, row in results:
+    for dist, rid in results:
+        row = details[rid]
         assets.append({
-            "id": row["asset_id"],
+            "id": rid,
             "path": row["path"],
             "filename": row["filename"],
             "pack": row["pack_name"],
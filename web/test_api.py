@@ -7,6 +7,7 @@
 #     "pytest>=8.0",
 #     "pillow>=10.0",
 #     "python-multipart>=0.0.9",
+#     "numpy>=1.24",
 # ]
 # ///
 """Tests for web API."""
@@ -1524,5 +1525,23 @@ def test_batch_pack_tags_validation(test_db):
                        json={"pack_names": [], "tag": "x", "op": "add"}).status_code == 400
 
 
+def test_find_db_follows_databases_created_and_removed(tmp_path, monkeypatch):
+    import api
+    nested = tmp_path / "project" / "sub"
+    nested.mkdir(parents=True)
+    monkeypatch.chdir(nested)
+    monkeypatch.delenv("ASSETS_DB", raising=False)
+    outer = tmp_path / "assets.db"
+    outer.touch()
+    assert api.find_db() == outer
+
+    inner = nested / "assets.db"
+    inner.touch()
+    assert api.find_db() == inner
+
+    inner.unlink()
+    assert api.find_db() == outer
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
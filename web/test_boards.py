@@ -7,6 +7,7 @@
 #     "pytest>=8.0",
 #     "pillow>=10.0",
 #     "python-multipart>=0.0.9",
+#     "numpy>=1.24",
 # ]
 # ///
 """Tests for UI-created boards."""